@@ -20,8 +20,17 @@ from apify import Actor
 from apify_client import ApifyClient
 from pathlib import Path
 from datetime import datetime
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
 import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
 
 # Import our tools
 from .tools.scraper_selector import (
@@ -29,20 +38,225 @@ from .tools.scraper_selector import (
     is_scraper_banned
 )
 from .tools.document_converter import (
-    convert_dataset_to_documents,
-    calculate_indexing_cost
-)
-from .tools.gemini_uploader import (
-    upload_to_gemini,
-    generate_query_guide
+    calculate_indexing_cost,
+    convert_dataset_item,
+    item_content_hash,
+    DuplicateFilter,
+    CONTENT_HASH_ALGO
 )
+# gemini_uploader (google-genai) is imported lazily in Phase 3+, so runs
+# that fail validation or scraping skip the cost
+from .utils.retry import is_transient_error, retry_call
+from .utils.circuit import CircuitBreaker
+
+
+def _available_cpus() -> int:
+    """CPUs this process may run on (os.cpu_count() reports the whole host)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+# Pipeline tuning (Phase 2 → 3 → 4 overlap)
+PIPELINE_QUEUE_SIZE = 32      # Max items buffered between stages
+CONVERTER_WORKERS_MAX = 4     # Cap: each worker is a full interpreter (memory)
+CONVERTER_WORKERS = min(_available_cpus(), CONVERTER_WORKERS_MAX)  # Conversion processes
+# Converter processes must not be forked: the event loop already runs
+# to_thread workers, and forking a multithreaded process can deadlock
+CONVERTER_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# State carried across runs lives in a named (persistent) KV store:
+# per-corpus manifests (incremental runs) and scraper circuit breakers
+STATE_STORE_NAME = 'gemini-knowledge-state'
+BREAKERS_KEY = 'breakers'
+SCRAPE_CACHE_PREFIX = 'scrape-cache-'  # + hash of (target, max_pages)
+
+
+def _log_summary(title: str, fields: Dict[str, object]) -> None:
+    """Log a phase summary as one multi-line record instead of one per field."""
+    Actor.log.info(
+        "%s\n%s",
+        title,
+        "\n".join(f"   {key}: {value}" for key, value in fields.items())
+    )
+
+
+def _configure_tool_logging() -> None:
+    """Send tools.* / utils.* log records (e.g. upload progress, retries) to stdout, message only."""
+    for subpackage in ('tools', 'utils'):
+        package_logger = logging.getLogger(f"{__package__}.{subpackage}")
+        if package_logger.handlers:
+            continue
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        package_logger.addHandler(handler)
+        package_logger.setLevel(logging.INFO)
+        package_logger.propagate = False
+
+
+def _manifest_key(corpus_name: str) -> str:
+    """Build the KV store key holding a corpus manifest (keys allow a limited charset)."""
+    return 'manifest-' + re.sub(r"[^a-zA-Z0-9!\-_.'()]", '-', corpus_name)
+
+
+def _scrape_cache_key(target: str, max_pages: int) -> str:
+    """Build the KV store key caching the scrape of (target, max_pages)."""
+    digest = hashlib.blake2b(f"{target}|{max_pages}".encode('utf-8'), digest_size=16).hexdigest()
+    return SCRAPE_CACHE_PREFIX + digest
+
+
+def _is_unchanged_page(known: Optional[Dict], item: Dict, content_hash: Optional[str]) -> bool:
+    """
+    Check an item against its manifest entry from the previous run.
+
+    Entries from older manifests were hashed with SHA-256: those are
+    compared with a SHA-256 of the item and, if unchanged, upgraded in
+    place to the current algorithm.
+
+    Args:
+        known: Manifest entry for the item's URL (or None)
+        item: Dataset item
+        content_hash: item_content_hash(item) with the current algorithm
+
+    Returns:
+        True if the page is unchanged and already indexed
+    """
+    if not (content_hash and known and known.get('document_name')):
+        return False
+
+    known_algo = known.get('hash_algo', 'sha256')
+    if known_algo != CONTENT_HASH_ALGO:
+        current_hash = item_content_hash(item, algo=known_algo)
+    else:
+        current_hash = content_hash
+
+    if current_hash != known.get('content_hash', known.get('sha256')):
+        return False
+
+    # Upgrade the entry in place to the current algorithm
+    known.pop('sha256', None)
+    known.update(content_hash=content_hash, hash_algo=CONTENT_HASH_ALGO)
+    return True
+
+
+def _stale_documents(known_pages: Dict[str, Dict], pages: Dict[str, Dict]) -> List[str]:
+    """Document names of previous-run pages that were re-indexed this run."""
+    return [
+        old['document_name'] for url, old in known_pages.items()
+        if url in pages and pages[url] is not old
+        and old.get('document_name') and pages[url].get('document_name')
+    ]
+
+
+def _merge_pages(known_pages: Dict[str, Dict], pages: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Merge this run's manifest entries into the previous run's.
+
+    Pages not seen this run (e.g. lower max_pages) stay indexed, and so do
+    previous copies of pages whose new upload never finished.
+    """
+    merged = dict(known_pages)
+    for url, page in pages.items():
+        if page.get('document_name') or url not in known_pages:
+            merged[url] = page
+    return merged
+
+
+def _store_of(document_name: str) -> str:
+    """Store resource name of a document ("fileSearchStores/<id>/documents/<id>")."""
+    return document_name.split('/documents/', 1)[0]
+
+
+async def _save_partial_manifest(
+    state_store,
+    manifest_key: str,
+    manifest: Optional[Dict],
+    target: str,
+    known_pages: Dict[str, Dict],
+    pages: Dict[str, Dict],
+    gemini_api_key: str
+) -> None:
+    """
+    Record the documents a failed run already uploaded.
+
+    Without this they would stay in the store untracked, and the next run
+    would upload the same pages again next to them. Superseded copies of
+    re-indexed pages are deleted, as at the end of a successful run.
+
+    Args:
+        state_store: Key-value store holding manifests
+        manifest_key: Key of this corpus' manifest
+        manifest: Manifest the run started from (or None)
+        target: Target URL
+        known_pages: Manifest entries from the previous run
+        pages: Manifest entries recorded by this run so far
+        gemini_api_key: Google Gemini API key
+    """
+    uploaded = [page['document_name'] for page in pages.values() if page.get('document_name')]
+    if not uploaded:
+        return
+
+    from .tools.gemini_uploader import delete_store_documents
+
+    stale_documents = _stale_documents(known_pages, pages)
+    if stale_documents:
+        await delete_store_documents(gemini_api_key, stale_documents)
+
+    await state_store.set_value(manifest_key, {
+        'target': target,
+        'store_name': manifest['store_name'] if manifest else _store_of(uploaded[0]),
+        'corpus': manifest['corpus'] if manifest else None,
+        'pages': _merge_pages(known_pages, pages)
+    })
+    Actor.log.warning("⚠️  Run failed: recorded %d uploaded documents in the manifest", len(uploaded))
+
+
+async def _verify_manifest_store(manifest: Optional[Dict], gemini_api_key: str) -> Optional[Dict]:
+    """
+    Drop a manifest whose File Search Store no longer exists.
+
+    Without this, a deleted store would make every incremental run fail
+    until force_full_rescrape is set; instead the run starts a new store
+    and re-indexes every page.
+
+    Args:
+        manifest: Manifest from the previous run (or None)
+        gemini_api_key: Google Gemini API key
+
+    Returns:
+        The manifest, or None if its store is gone
+    """
+    if not manifest:
+        return manifest
+
+    from .tools.gemini_uploader import file_search_store_exists
+
+    if await file_search_store_exists(gemini_api_key, manifest['store_name']):
+        return manifest
+
+    Actor.log.warning(
+        "⚠️  Store %s from the previous run no longer exists; re-indexing all pages into a new store",
+        manifest['store_name']
+    )
+    return None
+
+
+def _setup_workspace() -> Path:
+    """Create the scratch workspace and return its documents directory."""
+    workspace = Path("/tmp/scraper-workspace")
+    workspace.mkdir(parents=True, exist_ok=True)
+    docs_dir = workspace / "documents"
+    docs_dir.mkdir(exist_ok=True)
+    return docs_dir
 
 
 async def execute_scraper_with_fallback(
     apify_client: ApifyClient,
     selected_scrapers: List[dict],
     target: str,
-    max_pages: int
+    max_pages: int,
+    breaker: Optional[CircuitBreaker] = None
 ) -> dict:
     """
     Execute scraper with automatic fallback on failure.
@@ -52,20 +266,32 @@ async def execute_scraper_with_fallback(
         selected_scrapers: List of scrapers (primary + fallbacks)
         target: Target URL
         max_pages: Maximum pages to scrape
+        breaker: Circuit breaker keyed by scraper ID; scrapers whose
+            circuit is open are skipped without being called. Only
+            transient errors count as failures; an empty dataset counts
+            as a success (the scraper ran, the target had nothing for it)
 
     Returns:
-        Dict with success, data, scraper_used, errors
+        Dict with success, data, scraper_used, dataset_id, errors
+        (data is a lazy iterator over dataset items)
     """
     last_error = None
 
     for i, scraper in enumerate(selected_scrapers):
         scraper_id = scraper['id']
 
+        if breaker is not None and not breaker.allow(scraper_id):
+            last_error = f"Circuit breaker OPEN for {scraper_id}"
+            Actor.log.warning("⚠️  %s, skipping", last_error)
+            continue
+
         try:
-            Actor.log.info(f"Attempting scraper {i+1}/{len(selected_scrapers)}: {scraper_id}")
+            Actor.log.info("Attempting scraper %d/%d: %s", i + 1, len(selected_scrapers), scraper_id)
 
-            # Run scraper (HTML/web pages only)
-            run = apify_client.actor(scraper_id).call(
+            # Start scraper (HTML/web pages only); transient errors are retried
+            # against the same scraper before falling back to the next one
+            started = await retry_call(
+                apify_client.actor(scraper_id).start,
                 run_input={
                     'startUrls': [{'url': target}],
                     'maxCrawlPages': max_pages,
@@ -74,26 +300,42 @@ async def execute_scraper_with_fallback(
                 }
             )
 
-            # Get dataset
-            dataset_items = apify_client.dataset(run['defaultDatasetId']).list_items()
-            items = list(dataset_items.items)
+            # Wait on the started run; retried separately so a failed wait
+            # never starts a second (paid) run of the same scraper
+            run = await retry_call(apify_client.run(started['id']).wait_for_finish)
+            if run is None:
+                raise RuntimeError(f"Run {started['id']} of {scraper_id} not found")
+
+            # Stream dataset (items are paged lazily, never held as one list)
+            items = apify_client.dataset(run['defaultDatasetId']).iterate_items()
+            first_item = next(items, None)
 
-            if items:
-                Actor.log.info(f"✅ Scraper succeeded: {scraper_id} ({len(items)} items)")
+            if first_item is not None:
+                Actor.log.info("✅ Scraper succeeded: %s", scraper_id)
+                if breaker is not None:
+                    breaker.record_success(scraper_id)
 
                 return {
                     'success': True,
-                    'data': items,
+                    'data': chain([first_item], items),
                     'scraper_used': scraper_id,
+                    'dataset_id': run['defaultDatasetId'],
                     'errors': []
                 }
             else:
+                # The scraper itself worked: emptiness is specific to this
+                # target, so it must not open the circuit for other targets
                 last_error = f"No data returned from {scraper_id}"
-                Actor.log.warning(f"⚠️  {last_error}")
+                Actor.log.warning("⚠️  %s", last_error)
+                if breaker is not None:
+                    breaker.record_success(scraper_id)
 
         except Exception as e:
             last_error = str(e)
-            Actor.log.warning(f"⚠️  Scraper {scraper_id} failed: {last_error}")
+            Actor.log.warning("⚠️  Scraper %s failed: %s", scraper_id, last_error)
+            # Bad input / auth errors say nothing about the scraper's health
+            if breaker is not None and is_transient_error(e):
+                breaker.record_failure(scraper_id)
             continue
 
     # All scrapers failed
@@ -101,115 +343,395 @@ async def execute_scraper_with_fallback(
         'success': False,
         'data': [],
         'scraper_used': None,
+        'dataset_id': None,
         'errors': [last_error] if last_error else ['All scrapers failed']
     }
 
 
+async def execute_scraper_cached(
+    apify_client: ApifyClient,
+    cache_store,
+    cache_ttl_seconds: int,
+    **scrape_kwargs
+) -> dict:
+    """
+    Run execute_scraper_with_fallback, reusing a recent scrape of the same
+    target and max_pages if one is cached.
+
+    The cache stores the successful run's dataset ID (not the items), so a
+    hit re-reads that dataset instead of running a scraper again; a hit
+    whose dataset no longer exists (or is empty) is treated as a miss. Useful
+    for development iterations and for retrying runs that failed after
+    scraping.
+
+    Args:
+        apify_client: Apify client instance
+        cache_store: Key-value store holding cache entries
+        cache_ttl_seconds: Maximum age of a usable entry (0 = cache off)
+        **scrape_kwargs: Arguments for execute_scraper_with_fallback
+
+    Returns:
+        Same dict as execute_scraper_with_fallback
+    """
+    if cache_ttl_seconds <= 0:
+        return await execute_scraper_with_fallback(apify_client=apify_client, **scrape_kwargs)
+
+    cache_key = _scrape_cache_key(scrape_kwargs['target'], scrape_kwargs['max_pages'])
+    cached = await cache_store.get_value(cache_key)
+
+    if cached and time.time() - cached['ts'] < cache_ttl_seconds:
+        dataset_client = apify_client.dataset(cached['dataset_id'])
+        first_item = None
+        try:
+            # get() returns None once the dataset expired or was deleted
+            if await asyncio.to_thread(dataset_client.get) is None:
+                Actor.log.warning("⚠️  Cached dataset %s no longer exists, scraping again", cached['dataset_id'])
+            else:
+                items = dataset_client.iterate_items()
+                first_item = next(items, None)
+        except Exception as e:
+            Actor.log.warning("⚠️  Cached dataset %s unavailable: %s", cached['dataset_id'], e)
+
+        if first_item is not None:
+            Actor.log.info(
+                "♻️  Using cached scrape (%s, %.0fs old, dataset %s)",
+                cached['scraper_used'], time.time() - cached['ts'], cached['dataset_id']
+            )
+            return {
+                'success': True,
+                'data': chain([first_item], items),
+                'scraper_used': cached['scraper_used'],
+                'dataset_id': cached['dataset_id'],
+                'errors': []
+            }
+
+    result = await execute_scraper_with_fallback(apify_client=apify_client, **scrape_kwargs)
+
+    if result['success']:
+        await cache_store.set_value(cache_key, {
+            'ts': time.time(),
+            'dataset_id': result['dataset_id'],
+            'scraper_used': result['scraper_used']
+        })
+
+    return result
+
+
+async def convert_and_upload_pipeline(
+    scraped_items: Iterator[Dict],
+    docs_dir: Path,
+    gemini_api_key: str,
+    corpus_name: str,
+    known_pages: Optional[Dict[str, Dict]] = None,
+    store_name: Optional[str] = None,
+    upload_concurrency: Optional[int] = None,
+    pages: Optional[Dict[str, Dict]] = None
+) -> Tuple[List[Path], List[int], int, Optional[Dict], Dict[str, Dict]]:
+    """
+    Stream scraped items through conversion into Gemini upload.
+
+    Stages run concurrently, connected by bounded asyncio queues:
+    1. Producer pulls items from the (lazy) dataset iterator
+    2. Converter workers turn items into documents in worker processes
+    3. Uploader pushes each document to the File Search Store
+
+    Wall-clock time is roughly max(scrape, convert, upload) instead of
+    their sum.
+
+    Pages whose content hash matches their entry in known_pages (from the
+    previous run's manifest) are not converted or uploaded again, and
+    pages with identical content are converted only once.
+
+    Args:
+        scraped_items: Iterator over dataset items
+        docs_dir: Directory to save documents
+        gemini_api_key: Google Gemini API key
+        corpus_name: Name for the knowledge base
+        known_pages: Manifest entries from the previous run
+            ({url: {'content_hash': ..., 'hash_algo': ..., 'document_name': ...}})
+        store_name: Existing File Search Store to upload into
+        upload_concurrency: Maximum simultaneous Gemini uploads
+            (default: UPLOAD_CONCURRENCY)
+        pages: Optional dict that receives this run's manifest entries; it
+            also holds the documents uploaded so far if the pipeline fails
+
+    Returns:
+        Tuple of (documents, document character counts, pages_count,
+        corpus metadata or None if no documents were uploaded, manifest
+        entries for this run's pages)
+    """
+    from .tools.gemini_uploader import upload_stream_to_gemini, UPLOAD_CONCURRENCY
+
+    scrape_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    upload_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    documents: List[Path] = []
+    char_counts: List[int] = []
+    known_pages = known_pages or {}
+    pages = {} if pages is None else pages
+    dedup = DuplicateFilter()
+    doc_urls: Dict[str, str] = {}
+    uploaded_files: list = []  # gemini_uploader.FileRecords
+
+    async def produce() -> int:
+        count = 0
+        # Dataset pages are fetched by the blocking Apify client
+        while (item := await asyncio.to_thread(next, scraped_items, None)) is not None:
+            await scrape_queue.put((count, item))
+            count += 1
+
+        for _ in range(CONVERTER_WORKERS):
+            await scrape_queue.put(None)
+        return count
+
+    async def convert_worker(executor: ProcessPoolExecutor):
+        loop = asyncio.get_running_loop()
+        while (entry := await scrape_queue.get()) is not None:
+            index, item = entry
+            url = item.get('url', f'unknown-{index}')
+            content_hash = item_content_hash(item)
+
+            # Same page reached via several URLs: convert/index it once
+            if dedup.is_duplicate(content_hash):
+                continue
+
+            # Unchanged since the last run: keep the already-indexed copy
+            known = known_pages.get(url)
+            if _is_unchanged_page(known, item, content_hash):
+                pages[url] = known
+                continue
+
+            # HTML parsing is CPU-bound: run it outside the GIL
+            result = await loop.run_in_executor(
+                executor, convert_dataset_item, item, index, docs_dir
+            )
+            if result is not None:
+                doc_path, char_count = result
+                pages[url] = {
+                    'content_hash': content_hash,
+                    'hash_algo': CONTENT_HASH_ALGO,
+                    'document_name': None
+                }
+                doc_urls[str(doc_path)] = url
+                documents.append(doc_path)
+                char_counts.append(char_count)
+                await upload_queue.put(doc_path)
+
+    async def convert(executor: ProcessPoolExecutor) -> None:
+        await asyncio.gather(*(convert_worker(executor) for _ in range(CONVERTER_WORKERS)))
+        await upload_queue.put(None)
+
+    with ProcessPoolExecutor(
+        max_workers=CONVERTER_WORKERS,
+        mp_context=multiprocessing.get_context(CONVERTER_START_METHOD)
+    ) as executor:
+        tasks = [
+            asyncio.create_task(produce()),
+            asyncio.create_task(convert(executor)),
+            asyncio.create_task(upload_stream_to_gemini(
+                gemini_api_key=gemini_api_key,
+                document_queue=upload_queue,
+                corpus_name=corpus_name,
+                max_concurrency=upload_concurrency or UPLOAD_CONCURRENCY,
+                store_name=store_name,
+                uploaded_files=uploaded_files
+            ))
+        ]
+
+        try:
+            pages_count, _, gemini_corpus = await asyncio.gather(*tasks)
+        except BaseException:
+            # Don't leave stages blocked on a queue whose peer has died
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            for record in uploaded_files:
+                pages[doc_urls[record.path]]['document_name'] = record.document_name
+
+    if dedup.duplicates:
+        Actor.log.info("🔁 Deduped %d/%d items (identical content)", dedup.duplicates, pages_count)
+
+    return documents, char_counts, pages_count, gemini_corpus, pages
+
+
 async def main():
     async with Actor:
         # ========== STARTUP ==========
 
+        _configure_tool_logging()
         Actor.log.info("🚀 Gemini Knowledge Scraper starting...")
 
-        input_data = await Actor.get_input()
+        # Fetch input and set up workspace concurrently (independent I/O)
+        input_data, docs_dir = await asyncio.gather(
+            Actor.get_input(),
+            asyncio.to_thread(_setup_workspace)
+        )
+
+        # Validate inputs up front (fail fast, before any client is created)
+        input_data = input_data or {}
+        required = {'target', 'gemini_api_key', 'apify_token'}
+        missing = required - input_data.keys()
+        if missing:
+            raise ValueError(f"Missing required input: {', '.join(sorted(missing))}")
+
+        max_pages = input_data.get('max_pages', 100)
+        if isinstance(max_pages, bool) or not isinstance(max_pages, int) or max_pages < 1:
+            raise ValueError(f"max_pages must be a positive integer, got {max_pages!r}")
 
-        # Validate required inputs
-        required = ['target', 'gemini_api_key', 'apify_token']
-        for field in required:
-            if field not in input_data:
-                raise ValueError(f"Missing required input: {field}")
+        upload_concurrency = input_data.get('upload_concurrency')
+        if upload_concurrency is not None and (
+            isinstance(upload_concurrency, bool) or not isinstance(upload_concurrency, int) or upload_concurrency < 1
+        ):
+            raise ValueError(f"upload_concurrency must be a positive integer, got {upload_concurrency!r}")
 
-        # Setup workspace
-        workspace = Path("/tmp/scraper-workspace")
-        workspace.mkdir(parents=True, exist_ok=True)
-        docs_dir = workspace / "documents"
-        docs_dir.mkdir(exist_ok=True)
+        cache_ttl_seconds = input_data.get('cache_ttl_seconds', 0)
+        if isinstance(cache_ttl_seconds, bool) or not isinstance(cache_ttl_seconds, int) or cache_ttl_seconds < 0:
+            raise ValueError(f"cache_ttl_seconds must be a non-negative integer, got {cache_ttl_seconds!r}")
 
         # ========== PHASE 1: SCRAPER SELECTION ==========
 
-        Actor.log.info(f"\n📋 Phase 1: Scraper Selection")
-        Actor.log.info(f"Target: {input_data['target']}")
+        Actor.log.info("\n📋 Phase 1: Scraper Selection\nTarget: %s", input_data['target'])
 
-        # Initialize Apify client
+        # Initialize Apify client (one instance = one pooled keep-alive HTTP
+        # session; share it across all phases instead of creating new ones)
         apify_client = ApifyClient(input_data['apify_token'])
 
-        # Find and select best scrapers (banned filter applied)
-        selected_scrapers, target_type = await find_and_select_scrapers(
+        # Find and select best scrapers (banned-vetted library); pure CPU
+        # work over the precomputed library rankings, so no await needed
+        selected_scrapers, target_type = find_and_select_scrapers(
             apify_client=apify_client,
             target=input_data['target'],
             budget_mode=input_data.get('scraper_budget', 'optimal'),
             top_n=3  # Primary + 2 fallbacks
         )
 
-        Actor.log.info(f"Target type: {target_type}")
-        Actor.log.info(f"Selected {len(selected_scrapers)} scrapers (with fallbacks)")
+        # Load state from previous runs: scraper circuit breakers and the
+        # corpus manifest (incremental re-indexing), fetched concurrently
+        corpus_name = input_data.get('corpus_name', 'scraped-knowledge')
+        manifest_key = _manifest_key(corpus_name)
+        force_full = input_data.get('force_full_rescrape', False)
+        state_store = await Actor.open_key_value_store(name=STATE_STORE_NAME)
+        breaker_state, manifest = await asyncio.gather(
+            state_store.get_value(BREAKERS_KEY),
+            # force_full_rescrape: ignore the manifest (start a new store)
+            asyncio.sleep(0, result=None) if force_full else state_store.get_value(manifest_key)
+        )
+        breaker = CircuitBreaker.from_dict(breaker_state)
+        if manifest and manifest.get('target') != input_data['target']:
+            manifest = None  # Same corpus name, different site: start over
+        manifest = await _verify_manifest_store(manifest, input_data['gemini_api_key'])
+        known_pages = manifest['pages'] if manifest else {}
+
+        _log_summary("Scraper selection", {
+            'Target type': target_type,
+            'Selected': f"{len(selected_scrapers)} scrapers (with fallbacks)"
+        })
+
+        if manifest:
+            Actor.log.info("♻️  Incremental run: %d pages known in %s", len(known_pages), manifest['store_name'])
 
         # ========== PHASE 2: SCRAPE WITH FALLBACK ==========
 
-        Actor.log.info(f"\n🕷️  Phase 2: Web Scraping")
+        Actor.log.info("\n🕷️  Phase 2: Web Scraping")
 
-        scrape_result = await execute_scraper_with_fallback(
+        scrape_result = await execute_scraper_cached(
             apify_client=apify_client,
+            cache_store=state_store,
+            cache_ttl_seconds=cache_ttl_seconds,
             selected_scrapers=selected_scrapers,
             target=input_data['target'],
-            max_pages=input_data.get('max_pages', 100)
+            max_pages=max_pages,
+            breaker=breaker
         )
 
+        # Persist breaker state now, so it's kept even if the run fails below
+        await state_store.set_value(BREAKERS_KEY, breaker.to_dict())
+
         if not scrape_result['success']:
             raise RuntimeError(f"All scrapers failed: {scrape_result['errors']}")
 
         scraped_items = scrape_result['data']
         scraper_used = scrape_result['scraper_used']
 
-        Actor.log.info(f"✅ Scraped {len(scraped_items)} pages using {scraper_used}")
+        # ========== PHASE 3 + 4: CONVERSION → GEMINI UPLOAD (PIPELINED) ==========
 
-        # ========== PHASE 3: DOCUMENT CONVERSION ==========
+        Actor.log.info("\n📄 Phase 3: Document Conversion\n🧠 Phase 4: Gemini File Search Upload (pipelined with conversion)")
 
-        Actor.log.info(f"\n📄 Phase 3: Document Conversion")
+        from .tools.gemini_uploader import build_corpus_metadata, delete_store_documents, generate_query_guide
 
-        documents = convert_dataset_to_documents(
-            dataset_items=scraped_items,
-            output_dir=docs_dir,
-            url_field='url',
-            html_field='html'
-        )
+        # Items stream from the dataset through conversion into upload
+        pages: Dict[str, Dict] = {}
+        try:
+            documents, char_counts, pages_count, gemini_corpus, pages = await convert_and_upload_pipeline(
+                scraped_items=scraped_items,
+                docs_dir=docs_dir,
+                gemini_api_key=input_data['gemini_api_key'],
+                corpus_name=corpus_name,
+                known_pages=known_pages,
+                store_name=manifest['store_name'] if manifest else None,
+                upload_concurrency=upload_concurrency,
+                pages=pages
+            )
+        except Exception:
+            await _save_partial_manifest(
+                state_store, manifest_key, manifest, input_data['target'],
+                known_pages, pages, input_data['gemini_api_key']
+            )
+            raise
+
+        Actor.log.info("✅ Scraped %d pages using %s", pages_count, scraper_used)
 
-        if not documents:
+        unchanged_count = sum(1 for url, page in pages.items() if known_pages.get(url) is page)
+
+        if not documents and not unchanged_count:
             raise RuntimeError("No valid documents created from scraped data")
 
-        Actor.log.info(f"✅ Created {len(documents)} documents")
+        Actor.log.info("✅ Created %d documents (%d unchanged pages skipped)", len(documents), unchanged_count)
 
-        # Calculate indexing cost estimate
-        indexing_cost = calculate_indexing_cost(documents)
+        # Re-indexed pages: drop the superseded copies from the store
+        stale_documents = _stale_documents(known_pages, pages)
+        if stale_documents:
+            await delete_store_documents(input_data['gemini_api_key'], stale_documents)
 
-        # ========== PHASE 4: UPLOAD TO GEMINI ==========
+        # Pages not seen this run (e.g. lower max_pages) stay indexed
+        all_pages = _merge_pages(known_pages, pages)
+        if gemini_corpus is None:
+            # Nothing changed (no corpus recorded if the last run failed)
+            gemini_corpus = manifest['corpus'] or build_corpus_metadata(
+                manifest['store_name'], corpus_name, []
+            )
+        gemini_corpus['files_indexed'] = sum(1 for page in all_pages.values() if page.get('document_name'))
 
-        Actor.log.info(f"\n🧠 Phase 4: Gemini File Search Upload")
+        await state_store.set_value(manifest_key, {
+            'target': input_data['target'],
+            'store_name': gemini_corpus['file_search_store_name'],
+            'corpus': gemini_corpus,
+            'pages': all_pages
+        })
 
-        gemini_corpus = await upload_to_gemini(
-            gemini_api_key=input_data['gemini_api_key'],
-            document_paths=documents,
-            corpus_name=input_data.get('corpus_name', 'scraped-knowledge')
-        )
+        # Calculate indexing cost estimate
+        indexing_cost = calculate_indexing_cost(documents, char_counts)
 
-        Actor.log.info(f"✅ Knowledge base ready!")
-        Actor.log.info(f"   Store: {gemini_corpus['file_search_store_name']}")
-        Actor.log.info(f"   Files: {gemini_corpus['files_indexed']}")
-        Actor.log.info(f"   Cost: ${gemini_corpus['cost_estimate_usd']:.4f}")
+        _log_summary("✅ Knowledge base ready!", {
+            'Store': gemini_corpus['file_search_store_name'],
+            'Files': gemini_corpus['files_indexed'],
+            'Cost': f"${gemini_corpus['cost_estimate_usd']:.4f}"
+        })
 
         # ========== PHASE 5: PRICING (PER-PAGE MODEL) ==========
 
-        Actor.log.info(f"\n💰 Phase 5: Per-Page Charging")
+        Actor.log.info("\n💰 Phase 5: Per-Page Charging")
 
         # Charge per page processed (pay-per-event)
-        pages_count = len(scraped_items)
         price_per_page = 0.0015  # Base price (volume-focused), Store discounts applied automatically
 
-        Actor.log.info(f"  Pages indexed: {pages_count}")
-        Actor.log.info(f"  Base price: ${price_per_page}/page")
-        Actor.log.info(f"  Estimated cost: ${0.02 + (pages_count * price_per_page):.2f}")
-        Actor.log.info(f"  (Includes ~$0.02 actor start + ${pages_count * price_per_page:.2f} for pages)")
-        Actor.log.info(f"  💡 Store discounts apply automatically based on your Apify plan")
+        _log_summary("Pricing", {
+            'Pages indexed': pages_count,
+            'Base price': f"${price_per_page}/page",
+            'Estimated cost': f"${0.02 + (pages_count * price_per_page):.2f} "
+                              f"(~$0.02 actor start + ${pages_count * price_per_page:.2f} for pages)",
+            'Note': "💡 Store discounts apply automatically based on your Apify plan"
+        })
 
         # Charge for each page processed (Apify applies Store discounts automatically)
         if pages_count > 0:
@@ -217,17 +739,10 @@ async def main():
 
         # ========== PHASE 6: OUTPUT ==========
 
-        Actor.log.info(f"\n📤 Phase 6: Generate Output")
+        Actor.log.info("\n📤 Phase 6: Generate Output")
 
-        # Generate query guide
-        query_guide_path = workspace / "query-guide.md"
-        generate_query_guide(
-            corpus_metadata=gemini_corpus,
-            output_path=query_guide_path
-        )
-
-        # Read query guide content
-        query_guide_content = query_guide_path.read_text()
+        # Generate query guide (kept in memory, no disk round-trip)
+        query_guide_content = generate_query_guide(corpus_metadata=gemini_corpus)
 
         # Save query guide to key-value store (for output schema)
         await Actor.set_value('QUERY_GUIDE.md', query_guide_content, content_type='text/markdown')
@@ -237,11 +752,11 @@ async def main():
             'target': input_data['target'],
             'target_type': target_type,
             'scraper_used': scraper_used,
-            'pages_scraped': len(scraped_items),
+            'pages_scraped': pages_count,
             'documents_created': len(documents),
             'gemini_corpus': {
                 'file_search_store_name': gemini_corpus['file_search_store_name'],
-                'corpus_name': input_data.get('corpus_name', 'scraped-knowledge'),
+                'corpus_name': corpus_name,
                 'files_indexed': gemini_corpus['files_indexed'],
                 'storage_type': gemini_corpus['storage_type'],
                 'storage_persistence': gemini_corpus['storage_persistence'],
@@ -268,20 +783,21 @@ async def main():
 
         # ========== SUCCESS ==========
 
-        Actor.log.info(f"\n🎉 SUCCESS!")
-        Actor.log.info(f"")
-        Actor.log.info(f"Knowledge base created: {gemini_corpus['file_search_store_name']}")
-        Actor.log.info(f"Files indexed: {gemini_corpus['files_indexed']}")
-        Actor.log.info(f"Pages processed: {pages_count} × ${price_per_page} = ${pages_count * price_per_page:.2f}")
-        Actor.log.info(f"")
-        Actor.log.info(f"📖 See 'query-guide.md' in Key-Value Store for usage instructions")
-        Actor.log.info(f"")
-        Actor.log.info(f"💡 Your knowledge base is ready to query from:")
-        Actor.log.info(f"   - Python SDK (any device)")
-        Actor.log.info(f"   - Google AI Studio (web)")
-        Actor.log.info(f"   - Gemini mobile apps (iOS/Android)")
-        Actor.log.info(f"")
-        Actor.log.info(f"💰 Query costs: ~$0.001 each (essentially free)")
+        Actor.log.info(
+            "\n🎉 SUCCESS!\n\n"
+            "Knowledge base created: %s\n"
+            "Files indexed: %s\n"
+            "Pages processed: %d × $%s = $%.2f\n\n"
+            "📖 See 'query-guide.md' in Key-Value Store for usage instructions\n\n"
+            "💡 Your knowledge base is ready to query from:\n"
+            "   - Python SDK (any device)\n"
+            "   - Google AI Studio (web)\n"
+            "   - Gemini mobile apps (iOS/Android)\n\n"
+            "💰 Query costs: ~$0.001 each (essentially free)",
+            gemini_corpus['file_search_store_name'],
+            gemini_corpus['files_indexed'],
+            pages_count, price_per_page, pages_count * price_per_page
+        )
 
 
 if __name__ == '__main__':
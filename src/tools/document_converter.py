@@ -4,22 +4,80 @@ Document Conversion Module for Gemini Knowledge Scraper
 Converts scraped HTML/JSON data into clean text documents suitable for Gemini File Search.
 
 Key functions:
-- HTML → Text extraction (BeautifulSoup)
+- HTML → Text extraction (selectolax when installed, streaming lxml fallback)
+- Markdown passthrough (scrapers run with saveMarkdown)
 - Metadata header generation (source, date, title)
 - Text cleaning (remove noise, normalize whitespace)
 - Document formatting for optimal RAG indexing
 """
 
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 from pathlib import Path
 from datetime import datetime
-from bs4 import BeautifulSoup
+from functools import lru_cache
+import hashlib
+import os
 import re
 
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, Tag
+
+# bs4 and lxml are imported where used: only the selectolax-less fallback
+# and extract_main_content need them, so worker processes skip the import
+
+try:
+    # Optional C parser (lexbor): much faster HTML → text than BeautifulSoup
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    # Optional tokenizer: exact counts instead of the chars/5 heuristic
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# Elements never part of the main content
+NOISE_TAGS = ['script', 'style', 'nav', 'footer', 'iframe', 'noscript']
+
+# Class substrings marking ads/tracking widgets
+AD_CLASS_PATTERNS = [
+    'advertisement', 'ads', 'ad-container', 'sponsored',
+    'tracking', 'analytics', 'cookie-banner', 'popup'
+]
+
+_NOISE_SELECTOR = ','.join(NOISE_TAGS)
+_AD_CLASS_SELECTOR = ','.join(f'[class*="{pattern}" i]' for pattern in AD_CLASS_PATTERNS)
+_AD_CLASS_RE = re.compile('|'.join(map(re.escape, AD_CLASS_PATTERNS)), re.I)
+
+# Class substrings marking the main content area
+CONTENT_CLASS_PATTERNS = [
+    'content', 'main-content', 'article-content',
+    'post-content', 'entry-content', 'documentation'
+]
+
+_CONTENT_CLASS_RE = re.compile('|'.join(map(re.escape, CONTENT_CLASS_PATTERNS)), re.I)
+
+# Content hash for change detection (stored in manifests as hash_algo)
+CONTENT_HASH_ALGO = 'blake2b-128'
+
+# normalize_whitespace rules
+_TRAILING_WS_RE = re.compile(r'[^\S\n]+$', re.M)  # Trailing whitespace per line
+_MULTISPACE_RE = re.compile(r'[ \t]+')           # Runs of spaces/tabs
+_MULTINEWLINE_RE = re.compile(r'\n{3,}')          # 3+ newlines (2+ blank lines)
+
+# Markdown title (extract_markdown_title)
+_MD_HEADING_RE = re.compile(r'^#{1,6}\s+(.+)$', re.M)
+
+# Document filenames (= display names in the File Search Store)
+_FILENAME_UNSAFE_RE = re.compile(r'[^a-zA-Z0-9]+')
+FILENAME_SLUG_MAX = 80
+
 
 def clean_html_text(html: str) -> str:
     """
-    Extract clean text from HTML using BeautifulSoup.
+    Extract clean text from HTML.
 
     Removes:
     - Script tags
@@ -34,29 +92,152 @@ def clean_html_text(html: str) -> str:
     Returns:
         Clean text string with normalized whitespace
     """
-    # Parse HTML
-    soup = BeautifulSoup(html, 'lxml')
+    return _parse_and_extract(html, '')[1]
 
-    # Remove unwanted elements
-    for element in soup(['script', 'style', 'nav', 'footer', 'iframe', 'noscript']):
-        element.decompose()
 
-    # Remove common ad/tracking classes
-    ad_patterns = [
-        'advertisement', 'ads', 'ad-container', 'sponsored',
-        'tracking', 'analytics', 'cookie-banner', 'popup'
-    ]
-    for pattern in ad_patterns:
-        for element in soup.find_all(class_=re.compile(pattern, re.I)):
-            element.decompose()
+class _TextTarget:
+    """
+    lxml parser target that collects clean text and title candidates.
 
-    # Extract text
-    text = soup.get_text(separator='\n', strip=True)
+    Receives SAX-style events instead of building a tree, so memory stays
+    proportional to tag depth. Content inside noise tags or ad-classed
+    elements is dropped via skip_depth.
+    """
 
-    # Clean whitespace
-    text = normalize_whitespace(text)
+    def __init__(self):
+        self.parts: List[str] = []
+        self.title_parts: List[str] = []
+        self.h1_parts: List[str] = []
+        self.og_title: Optional[str] = None
+        self.skip_depth = 0
+        self.in_title = False
+        self.h1_depth = 0
+        self.h1_done = False
+        self._buffer: List[str] = []
+
+    def _flush(self):
+        # Emit the pending text node (lxml may deliver one node in chunks)
+        if self._buffer:
+            text = ''.join(self._buffer).strip()
+            self._buffer.clear()
+            if text:
+                self.parts.append(text)
+
+    def start(self, tag, attrs):
+        self._flush()
+        if self.skip_depth:
+            self.skip_depth += 1
+        elif tag in NOISE_TAGS or _AD_CLASS_RE.search(attrs.get('class', '')):
+            self.skip_depth = 1
+
+        if tag == 'title':
+            self.in_title = True
+        elif tag == 'h1' and not self.h1_done:
+            self.h1_depth += 1
+        elif self.h1_depth:
+            self.h1_depth += 1
+        elif tag == 'meta' and self.og_title is None and attrs.get('property') == 'og:title':
+            self.og_title = attrs.get('content') or ''
+
+    def end(self, tag):
+        self._flush()
+        if self.skip_depth:
+            self.skip_depth -= 1
+
+        if tag == 'title':
+            self.in_title = False
+        elif self.h1_depth:
+            self.h1_depth -= 1
+            if not self.h1_depth:
+                self.h1_done = True
+
+    def data(self, data):
+        if self.in_title:
+            self.title_parts.append(data)
+        if self.h1_depth:
+            self.h1_parts.append(data.strip())
+        if not self.skip_depth:
+            self._buffer.append(data)
+
+    def comment(self, text):
+        # Comments split text nodes, as in a parsed tree
+        self._flush()
+
+    def close(self):
+        self._flush()
+        return self
+
+
+def _parse_and_extract(html: str, url: str) -> Tuple[str, str]:
+    """
+    Parse HTML once and extract both title and clean text.
 
-    return text
+    Uses selectolax (lexbor) when installed, otherwise a streaming lxml
+    target parser that never materializes the DOM.
+
+    Args:
+        html: Raw HTML string
+        url: Source URL (for title fallback)
+
+    Returns:
+        Tuple of (title, clean_text)
+    """
+    if LexborHTMLParser is not None:
+        return _parse_and_extract_lexbor(html, url)
+
+    from lxml import etree
+
+    target = _TextTarget()
+    if html:
+        parser = etree.HTMLParser(target=target)
+        parser.feed(html)
+        parser.close()
+
+    # Title: same priority cascade as extract_title
+    title = (
+        ''.join(target.title_parts).strip()
+        or ''.join(target.h1_parts)
+        or (target.og_title or '').strip()
+        or title_from_url(url)
+    )
+
+    return title, normalize_whitespace('\n'.join(target.parts))
+
+
+def _parse_and_extract_lexbor(html: str, url: str) -> Tuple[str, str]:
+    """selectolax/lexbor implementation of _parse_and_extract."""
+    tree = LexborHTMLParser(html)
+
+    # Title: same priority cascade as extract_title
+    title = None
+    title_node = tree.css_first('title')
+    if title_node is not None:
+        title = title_node.text().strip()
+    if not title:
+        h1 = tree.css_first('h1')
+        if h1 is not None:
+            title = h1.text(strip=True)
+    if not title:
+        og_title = tree.css_first('meta[property="og:title"]')
+        if og_title is not None:
+            title = (og_title.attributes.get('content') or '').strip()
+    if not title:
+        title = title_from_url(url)
+
+    # Remove noise + ads; reversed so nested matches go before their parents
+    for selector in (_NOISE_SELECTOR, _AD_CLASS_SELECTOR):
+        for node in reversed(tree.css(selector)):
+            node.decompose()
+
+    # One line per non-blank text node, like _TextTarget (root.text(strip=True)
+    # would also emit the whitespace-only nodes between tags as blank lines)
+    root = tree.root
+    parts = [
+        text for node in root.traverse(include_text=True)
+        if node.tag == '-text' and (text := node.text_content.strip())
+    ] if root is not None else []
+
+    return title, normalize_whitespace('\n'.join(parts))
 
 
 def normalize_whitespace(text: str) -> str:
@@ -74,18 +255,10 @@ def normalize_whitespace(text: str) -> str:
     Returns:
         Text with normalized whitespace
     """
-    # Replace tabs with spaces
-    text = text.replace('\t', ' ')
-
-    # Strip trailing whitespace from each line
-    lines = [line.rstrip() for line in text.split('\n')]
-
-    # Collapse multiple spaces within lines
-    lines = [re.sub(r' +', ' ', line) for line in lines]
-
-    # Collapse multiple blank lines (max 2 newlines = 1 blank line)
-    text = '\n'.join(lines)
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    # One C-level pass per rule instead of a Python loop over lines
+    text = _TRAILING_WS_RE.sub('', text)
+    text = _MULTISPACE_RE.sub(' ', text)
+    text = _MULTINEWLINE_RE.sub('\n\n', text)
 
     return text.strip()
 
@@ -107,23 +280,19 @@ def extract_title(html: str, url: str) -> str:
     Returns:
         Page title
     """
-    soup = BeautifulSoup(html, 'lxml')
+    return _parse_and_extract(html, url)[0]
 
-    # Try <title>
-    if soup.title and soup.title.string:
-        return soup.title.string.strip()
 
-    # Try <h1>
-    h1 = soup.find('h1')
-    if h1:
-        return h1.get_text(strip=True)
+def title_from_url(url: str) -> str:
+    """
+    Derive a readable title from a URL's last path segment.
 
-    # Try Open Graph title
-    og_title = soup.find('meta', property='og:title')
-    if og_title and og_title.get('content'):
-        return og_title['content'].strip()
+    Args:
+        url: Source URL
 
-    # Fallback: URL basename
+    Returns:
+        Title-cased basename, or 'Untitled' if the path is empty
+    """
     from urllib.parse import urlparse
     path = urlparse(url).path
     basename = path.rstrip('/').split('/')[-1]
@@ -156,14 +325,7 @@ def create_metadata_header(
     if scraped_at is None:
         scraped_at = datetime.now()
 
-    header = f"""---
-Source: {url}
-Title: {title}
-Scraped: {scraped_at.isoformat()}
----
-
-"""
-    return header
+    return f"---\nSource: {url}\nTitle: {title}\nScraped: {scraped_at.isoformat()}\n---\n\n"
 
 
 def convert_html_to_document(
@@ -171,13 +333,13 @@ def convert_html_to_document(
     url: str,
     output_path: Path,
     include_metadata: bool = True
-) -> Path:
+) -> Tuple[Path, int]:
     """
     Convert HTML to a clean text document suitable for Gemini indexing.
 
     Workflow:
-    1. Extract title
-    2. Clean HTML → text
+    1. Parse HTML once
+    2. Extract title, clean HTML → text
     3. Add metadata header (if enabled)
     4. Save to file
 
@@ -188,104 +350,280 @@ def convert_html_to_document(
         include_metadata: Whether to add metadata header
 
     Returns:
-        Path to created document
+        Tuple of (path to created document, document length in characters)
 
     Side effects:
         Creates file at output_path
     """
-    # Extract title
-    title = extract_title(html, url)
+    # Extract title + clean HTML (single parse)
+    title, clean_text = _parse_and_extract(html, url)
 
-    # Clean HTML
-    clean_text = clean_html_text(html)
+    # Save header + text to file
+    header = create_metadata_header(url, title) if include_metadata else ''
+    char_count = _write_document(output_path, header, clean_text)
 
-    # Build document
-    if include_metadata:
-        header = create_metadata_header(url, title)
-        document = header + clean_text
-    else:
-        document = clean_text
+    return output_path, char_count
+
+
+def _write_document(output_path: Path, header: str, text: str) -> int:
+    """
+    Write a document as header + text without concatenating them first.
 
-    # Save to file
+    Returns:
+        Document length in characters
+    """
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(document, encoding='utf-8')
+    with output_path.open('wb') as f:
+        f.write(header.encode('utf-8'))
+        f.write(text.encode('utf-8'))
+    return len(header) + len(text)
+
+
+def extract_markdown_title(item: Dict, markdown: str, url: str) -> str:
+    """
+    Extract page title for a markdown dataset item.
+
+    Priority:
+    1. Scraper-provided metadata title (metadata.title / title)
+    2. First markdown heading
+    3. URL basename as fallback
+
+    Args:
+        item: Item from Apify dataset
+        markdown: Markdown content of the item
+        url: Source URL (for fallback)
+
+    Returns:
+        Page title
+    """
+    title = (item.get('metadata') or {}).get('title') or item.get('title')
+    if title:
+        return title.strip()
+
+    heading = _MD_HEADING_RE.search(markdown)
+    if heading:
+        return heading.group(1).strip()
+
+    return title_from_url(url)
+
+
+def convert_markdown_to_document(
+    markdown: str,
+    url: str,
+    title: str,
+    output_path: Path,
+    include_metadata: bool = True
+) -> Tuple[Path, int]:
+    """
+    Save scraper-provided markdown as a document (no HTML parsing needed).
+
+    Args:
+        markdown: Clean markdown from the scraper
+        url: Source URL
+        title: Page title
+        output_path: Where to save the document
+        include_metadata: Whether to add metadata header
+
+    Returns:
+        Tuple of (path to created document, document length in characters)
+
+    Side effects:
+        Creates file at output_path
+    """
+    # Only collapse blank-line runs: indentation is significant in markdown
+    text = _MULTINEWLINE_RE.sub('\n\n', markdown).strip()
+
+    header = create_metadata_header(url, title) if include_metadata else ''
+    char_count = _write_document(output_path, header, text)
 
-    return output_path
+    return output_path, char_count
 
 
-def convert_dataset_to_documents(
-    dataset_items: List[Dict],
+def get_item_html(item: Dict, html_field: str = 'html') -> str:
+    """
+    Get HTML/text content from a dataset item.
+
+    Tries multiple field names (different scrapers use different fields).
+
+    Args:
+        item: Item from Apify dataset
+        html_field: Preferred field name containing HTML
+
+    Returns:
+        Content string ('' if no field has content)
+    """
+    return (
+        item.get(html_field, '') or           # Default field
+        item.get('html', '') or                # Standard HTML field
+        item.get('text', '') or                # Text content field
+        item.get('markdown', '') or            # Markdown field
+        item.get('content', '') or             # Generic content field
+        item.get('crawl', {}).get('html', '')  # Nested HTML field
+    )
+
+
+def item_content_hash(
+    item: Dict,
+    html_field: str = 'html',
+    algo: str = CONTENT_HASH_ALGO
+) -> Optional[str]:
+    """
+    Hash the content a dataset item would be converted from.
+
+    Used to detect pages that are unchanged since the previous run. This
+    is change detection, not security: 128-bit BLAKE2b is ample and
+    faster than SHA-256 on CPUs without SHA extensions.
+
+    Args:
+        item: Item from Apify dataset
+        html_field: Preferred field name containing HTML
+        algo: 'blake2b-128' (default) or 'sha256' (older manifests)
+
+    Returns:
+        Hex digest, or None if the item has no content
+    """
+    content = item.get('markdown') or get_item_html(item, html_field)
+    if not content:
+        return None
+    if algo == 'sha256':
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def document_filename(url: str, content_hash: str, extension: str) -> str:
+    """
+    Build a document filename from its URL and content hash.
+
+    The filename is the document's display name in the File Search Store,
+    so it must stay unique across runs that add to the same store: the URL
+    slug makes citations readable, the content hash keeps names distinct.
+
+    Args:
+        url: Source URL
+        content_hash: item_content_hash of the item
+        extension: File extension including the dot ('.md' / '.txt')
+
+    Returns:
+        Filename, e.g. "docs-example-com-guide-intro-3f2a9c1d0b7e.md"
+    """
+    from urllib.parse import urlparse
+    parsed = urlparse(url)
+    slug = _FILENAME_UNSAFE_RE.sub('-', f"{parsed.netloc}{parsed.path}").strip('-').lower()
+    return f"{slug[:FILENAME_SLUG_MAX].rstrip('-') or 'page'}-{content_hash[:12]}{extension}"
+
+
+def convert_dataset_item(
+    item: Dict,
+    index: int,
     output_dir: Path,
     url_field: str = 'url',
     html_field: str = 'html'
-) -> List[Path]:
+) -> Optional[Tuple[Path, int]]:
     """
-    Convert Apify dataset items to documents.
-
-    Apify scrapers return datasets (list of dicts) with HTML/text content.
-    This function converts each item to a clean text document.
+    Convert a single Apify dataset item to a document.
 
     Args:
-        dataset_items: List of items from Apify dataset
-        output_dir: Directory to save documents
+        item: Item from Apify dataset
+        index: Position of the item in the dataset (labels items without a URL)
+        output_dir: Directory to save the document
         url_field: Field name containing URL
         html_field: Field name containing HTML
 
     Returns:
-        List of paths to created documents
-
-    Example dataset item:
-        {
-            "url": "https://example.com/page1",
-            "html": "<html>...</html>",
-            "title": "Example Page",
-            ...
-        }
-    """
-    output_dir.mkdir(parents=True, exist_ok=True)
-    created_docs = []
-
-    for i, item in enumerate(dataset_items):
-        url = item.get(url_field, f'unknown-{i}')
-
-        # Try multiple field names (different scrapers use different fields)
-        html = (
-            item.get(html_field, '') or           # Default field
-            item.get('html', '') or                # Standard HTML field
-            item.get('text', '') or                # Text content field
-            item.get('markdown', '') or            # Markdown field
-            item.get('content', '') or             # Generic content field
-            item.get('crawl', {}).get('html', '')  # Nested HTML field
+        Tuple of (path to created document, document length in
+        characters), or None if the item has no content
+    """
+    url = item.get(url_field, f'unknown-{index}')
+
+    # Fast path: scraper already produced clean markdown (saveMarkdown),
+    # so skip the HTML → text conversion entirely
+    markdown = item.get('markdown')
+    if markdown:
+        filename = document_filename(url, item_content_hash(item, html_field), '.md')
+        result = convert_markdown_to_document(
+            markdown=markdown,
+            url=url,
+            title=extract_markdown_title(item, markdown, url),
+            output_path=output_dir / filename,
+            include_metadata=True
         )
 
-        if not html:
-            print(f"⚠️  Skipping {url} - no content in any field (tried: {html_field}, html, text, markdown, content, crawl.html)")
-            continue
+        print(f"✅ Converted (markdown): {url} → {filename}")
+        return result
 
-        # Generate filename from index
-        filename = f"doc_{i:04d}.txt"
-        output_path = output_dir / filename
+    html = get_item_html(item, html_field)
 
-        # Convert
-        doc_path = convert_html_to_document(
-            html=html,
-            url=url,
-            output_path=output_path,
-            include_metadata=True
-        )
+    if not html:
+        print(f"⚠️  Skipping {url} - no content in any field (tried: {html_field}, html, text, markdown, content, crawl.html)")
+        return None
+
+    # Generate filename from URL + content hash (unique within the store)
+    filename = document_filename(url, item_content_hash(item, html_field), '.txt')
+    output_path = output_dir / filename
+
+    # Convert
+    result = convert_html_to_document(
+        html=html,
+        url=url,
+        output_path=output_path,
+        include_metadata=True
+    )
 
-        created_docs.append(doc_path)
-        print(f"✅ Converted: {url} → {filename}")
+    print(f"✅ Converted (html): {url} → {filename}")
+    return result
 
-    print(f"\n📄 Created {len(created_docs)} documents in {output_dir}")
-    return created_docs
+
+class DuplicateFilter:
+    """
+    Skip items whose content was already seen (same page under several URLs).
+
+    Example:
+        >>> dedup = DuplicateFilter()
+        >>> for item in dataset_items:
+        ...     if dedup.is_duplicate(item_content_hash(item)):
+        ...         continue
+        ...     convert_dataset_item(item, i, output_dir)
+        >>> print(f"Deduped {dedup.duplicates} items")
+    """
+
+    __slots__ = ('_seen', 'duplicates')
+
+    def __init__(self):
+        self._seen = set()
+        self.duplicates = 0
+
+    def is_duplicate(self, content_hash: Optional[str]) -> bool:
+        """
+        Record content_hash; return True if it was seen before.
+
+        Args:
+            content_hash: item_content_hash of the item (None for items
+                without content, which are never duplicates)
+
+        Returns:
+            True if the item should be skipped
+        """
+        if content_hash is None:
+            return False
+        if content_hash in self._seen:
+            self.duplicates += 1
+            return True
+        self._seen.add(content_hash)
+        return False
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the tiktoken encoding on first use (may download its BPE file)."""
+    return tiktoken.get_encoding('cl100k_base')
 
 
 def estimate_tokens(text: str) -> int:
     """
-    Estimate token count for text (rough approximation).
+    Estimate token count for text.
 
-    Rule of thumb:
+    Uses tiktoken (cl100k_base) when installed. Otherwise falls back to a
+    rough approximation:
     - English: ~4 characters per token
     - Technical docs: ~5 characters per token (more jargon)
 
@@ -295,11 +633,17 @@ def estimate_tokens(text: str) -> int:
     Returns:
         Estimated token count
     """
+    if tiktoken is not None:
+        return len(_get_encoding().encode_ordinary(text))
+
     # Use conservative estimate (5 chars per token for technical content)
     return len(text) // 5
 
 
-def calculate_indexing_cost(documents: List[Path]) -> float:
+def calculate_indexing_cost(
+    documents: List[Path],
+    char_counts: Optional[List[int]] = None
+) -> float:
     """
     Calculate estimated Gemini indexing cost.
 
@@ -308,16 +652,18 @@ def calculate_indexing_cost(documents: List[Path]) -> float:
 
     Args:
         documents: List of document paths
+        char_counts: Document lengths recorded at conversion time; if
+            omitted, file sizes are used instead (bytes ≈ chars for
+            mostly-ASCII text), so documents are never read back
 
     Returns:
         Estimated cost in USD
     """
-    total_tokens = 0
+    if char_counts is None:
+        char_counts = [os.path.getsize(doc_path) for doc_path in documents]
 
-    for doc_path in documents:
-        text = doc_path.read_text(encoding='utf-8')
-        tokens = estimate_tokens(text)
-        total_tokens += tokens
+    # Same ~5 chars/token rule as the estimate_tokens fallback
+    total_tokens = sum(char_counts) // 5
 
     # Calculate cost
     cost_per_million = 0.15
@@ -332,7 +678,7 @@ def calculate_indexing_cost(documents: List[Path]) -> float:
 
 # ========== HELPER FUNCTIONS ==========
 
-def extract_main_content(html: str) -> str:
+def extract_main_content(html_or_soup: Union[str, 'BeautifulSoup']) -> 'Tag':
     """
     Try to extract main content area (heuristic-based).
 
@@ -344,96 +690,27 @@ def extract_main_content(html: str) -> str:
     Fallback to full body if not found.
 
     Args:
-        html: Raw HTML
-
-    Returns:
-        Main content HTML (subset of input)
-    """
-    soup = BeautifulSoup(html, 'lxml')
-
-    # Try semantic tags
-    main = soup.find('main')
-    if main:
-        return str(main)
-
-    article = soup.find('article')
-    if article:
-        return str(article)
-
-    # Try common content class names
-    content_patterns = [
-        'content', 'main-content', 'article-content',
-        'post-content', 'entry-content', 'documentation'
-    ]
-    for pattern in content_patterns:
-        content = soup.find(class_=re.compile(pattern, re.I))
-        if content:
-            return str(content)
-
-    # Fallback: body
-    body = soup.find('body')
-    return str(body) if body else html
-
-
-def split_long_document(
-    text: str,
-    max_tokens: int = 10000,
-    overlap: int = 500
-) -> List[str]:
-    """
-    Split a long document into chunks (if needed for very large docs).
-
-    Gemini File Search handles chunking automatically, but for very large
-    documents (>50K tokens), pre-splitting can improve quality.
-
-    Args:
-        text: Input text
-        max_tokens: Maximum tokens per chunk
-        overlap: Token overlap between chunks (for context continuity)
+        html_or_soup: Raw HTML, or an already-parsed tree (skips a
+            second parse)
 
     Returns:
-        List of text chunks
+        Main content node (subtree of the parsed tree); extract text
+        from it directly rather than serializing it back to HTML
     """
-    estimated_tokens = estimate_tokens(text)
-
-    # No split needed
-    if estimated_tokens <= max_tokens:
-        return [text]
-
-    # Split on paragraphs (preserves structure)
-    paragraphs = text.split('\n\n')
-
-    chunks = []
-    current_chunk = []
-    current_tokens = 0
-
-    for para in paragraphs:
-        para_tokens = estimate_tokens(para)
-
-        if current_tokens + para_tokens > max_tokens and current_chunk:
-            # Save current chunk
-            chunks.append('\n\n'.join(current_chunk))
-
-            # Start new chunk with overlap (last few paragraphs)
-            overlap_paras = []
-            overlap_tokens = 0
-            for prev_para in reversed(current_chunk):
-                prev_tokens = estimate_tokens(prev_para)
-                if overlap_tokens + prev_tokens <= overlap:
-                    overlap_paras.insert(0, prev_para)
-                    overlap_tokens += prev_tokens
-                else:
-                    break
-
-            current_chunk = overlap_paras
-            current_tokens = overlap_tokens
-
-        current_chunk.append(para)
-        current_tokens += para_tokens
-
-    # Add final chunk
-    if current_chunk:
-        chunks.append('\n\n'.join(current_chunk))
-
-    print(f"📚 Split document into {len(chunks)} chunks ({estimated_tokens:,} tokens)")
-    return chunks
+    if isinstance(html_or_soup, str):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html_or_soup, 'lxml')
+    else:
+        soup = html_or_soup
+
+    # Try semantic tags, then common content class names
+    content = (
+        soup.find('main') or
+        soup.find('article') or
+        soup.find(class_=_CONTENT_CLASS_RE)
+    )
+    if content:
+        return content
+
+    # Fallback: body (or the whole tree for body-less fragments)
+    return soup.find('body') or soup
@@ -17,12 +17,122 @@ Documentation:
 - Queries: Standard Gemini model pricing (~$0.002/query typical, subject to Google's rates)
 """
 
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 from pathlib import Path
 from datetime import datetime
+from dataclasses import asdict, dataclass
 import asyncio
+import logging
 from google import genai
-from google.genai import types
+from google.genai import errors, types
+
+from ..utils.retry import with_retry
+
+
+# Upload tuning
+UPLOAD_CONCURRENCY = 8         # Max documents uploading at once (default)
+UPLOAD_MAX_RETRIES = 4         # Retries per document on transient API errors
+UPLOAD_RETRY_BASE_DELAY = 1.0  # Seconds, backoff base (doubled per retry, full jitter)
+POLL_INITIAL_DELAY = 0.1       # Seconds before the first import status check
+POLL_BACKOFF = 1.5             # Poll delay multiplier
+POLL_MAX_DELAY = 2.0           # Seconds, cap on the poll delay
+PROGRESS_INTERVAL = 10.0       # Seconds between "Importing..." log lines
+
+# Gemini API calls retried on rate limits (429) and server errors (5xx)
+_api_retry = with_retry(max_attempts=UPLOAD_MAX_RETRIES + 1, base=UPLOAD_RETRY_BASE_DELAY)
+
+# custom_metadata keys attached to every uploaded document
+_KEY_SOURCE = 'source_path'
+_KEY_UPLOAD = 'upload_date'
+_KEY_SIZE = 'file_size'
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True, frozen=True)
+class FileRecord:
+    """Metadata of one document imported into a File Search Store."""
+    name: str                     # File name (display name in the store)
+    document_name: Optional[str]  # Store document resource name
+    path: str                     # Local source path
+    size: int                     # Bytes
+    imported_at: str              # ISO timestamp
+
+
+def _validate_document(doc_path: Path) -> int:
+    """
+    Check that a document exists and is non-empty, before uploading it.
+
+    Blocking (stat): call it via asyncio.to_thread.
+
+    Args:
+        doc_path: Document file path
+
+    Returns:
+        File size in bytes
+
+    Raises:
+        FileNotFoundError: If the document doesn't exist
+        ValueError: If the document is empty
+    """
+    try:
+        size = doc_path.stat().st_size
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Document not found: {doc_path}") from None
+
+    if size == 0:
+        raise ValueError(f"Document is empty: {doc_path}")
+    return size
+
+
+async def _store_exists(client: genai.Client, store_name: str) -> bool:
+    """
+    Check that a File Search Store still exists (e.g. wasn't deleted).
+
+    Only "not found" counts as missing; other errors (bad API key, rate
+    limits) propagate instead of being mistaken for a deleted store.
+    """
+    try:
+        await asyncio.to_thread(client.file_search_stores.get, name=store_name)
+    except errors.ClientError as e:
+        if e.code == 404:
+            return False
+        raise
+    return True
+
+
+@_api_retry
+async def _start_upload(
+    client: genai.Client,
+    store_name: str,
+    doc_path: Path,
+    size: int,
+    upload_date: str
+):
+    """Start importing one document into a store; returns the import operation."""
+    path_str = str(doc_path)
+    # The SDK call is blocking, so run it in a thread to allow concurrent uploads
+    return await asyncio.to_thread(
+        client.file_search_stores.upload_to_file_search_store,
+        file=path_str,
+        file_search_store_name=store_name,
+        config={
+            'display_name': doc_path.name,
+            'custom_metadata': [
+                {'key': _KEY_SOURCE, 'string_value': path_str},
+                {'key': _KEY_UPLOAD, 'string_value': upload_date},
+                {'key': _KEY_SIZE, 'string_value': str(size)}
+            ]
+        }
+    )
+
+
+@_api_retry
+async def _get_operation(client: genai.Client, operation):
+    """Refresh an import operation's status."""
+    # Blocking HTTP call: keep the event loop free for the other uploads
+    return await asyncio.to_thread(client.operations.get, operation)
 
 
 async def create_file_search_store(
@@ -53,131 +163,203 @@ async def create_file_search_store(
     if display_name is None:
         display_name = store_name
 
-    # Create File Search Store
-    file_search_store = client.file_search_stores.create(
+    # Create File Search Store (blocking SDK call, run off the event loop)
+    file_search_store = await asyncio.to_thread(
+        client.file_search_stores.create,
         config={'display_name': display_name}
     )
 
-    print(f"✅ Created File Search Store: {file_search_store.name}")
-    print(f"   Display name: {display_name}")
-    print(f"   Persistence: Indefinite (until manually deleted)")
+    logger.info("✅ Created File Search Store: %s", file_search_store.name)
+    logger.info("   Display name: %s", display_name)
+    logger.info("   Persistence: Indefinite (until manually deleted)")
 
     return file_search_store.name
 
 
-async def upload_documents_to_store(
+async def _report_progress(name: str, interval: float = PROGRESS_INTERVAL) -> None:
+    """Log an "Importing..." line every interval seconds until cancelled."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    while True:
+        await asyncio.sleep(interval)
+        logger.info("      Importing %s... (%.0fs elapsed)", name, loop.time() - started)
+
+
+async def upload_document_to_store(
     client: genai.Client,
     store_name: str,
-    document_paths: List[Path],
-    max_wait: int = 300
-) -> List[Dict]:
+    doc_path: Path,
+    max_wait: int = 300,
+    size: Optional[int] = None,
+    upload_date: Optional[str] = None
+) -> FileRecord:
     """
-    Upload documents to a File Search Store.
-
-    CRITICAL: Uses upload_to_file_search_store (persistent)
-    NOT files.upload (which deletes after 48h)
-
-    Workflow:
-    1. Upload each document to the store
-    2. Wait for import operations to complete
-    3. Return metadata for uploaded files
+    Upload a single document to a File Search Store and wait for import.
 
     Args:
         client: Initialized Gemini client
         store_name: File Search Store name (from create_file_search_store)
-        document_paths: List of document file paths
-        max_wait: Maximum seconds to wait per file (default: 300s)
+        doc_path: Document file path
+        max_wait: Maximum seconds to wait for the import (default: 300s)
+        size: File size in bytes, if already validated (saves a stat)
+        upload_date: ISO timestamp for the upload_date metadata (default:
+            now; upload_stream_to_gemini passes one shared value)
 
     Returns:
-        List of uploaded file metadata dicts
+        FileRecord of the imported document
 
     Raises:
+        FileNotFoundError: If the document doesn't exist
+        ValueError: If the document is empty
         TimeoutError: If import takes longer than max_wait
         RuntimeError: If import fails
+        errors.APIError: If the upload fails (after retrying transient errors)
     """
-    uploaded_files = []
-
-    print(f"\n📤 Uploading {len(document_paths)} documents to {store_name}...")
-
-    for i, doc_path in enumerate(document_paths, 1):
-        print(f"   [{i}/{len(document_paths)}] Uploading {doc_path.name}...")
-
-        # Upload to File Search Store (NOT basic files.upload!)
-        operation = client.file_search_stores.upload_to_file_search_store(
-            file=str(doc_path),
-            file_search_store_name=store_name,
-            config={
-                'display_name': doc_path.name,
-                'custom_metadata': [
-                    {'key': 'source_path', 'string_value': str(doc_path)},
-                    {'key': 'upload_date', 'string_value': datetime.now().isoformat()},
-                    {'key': 'file_size', 'string_value': str(doc_path.stat().st_size)}
-                ]
-            }
-        )
+    if size is None:
+        size = await asyncio.to_thread(_validate_document, doc_path)
+    if upload_date is None:
+        upload_date = datetime.now().isoformat()
+
+    # Upload to File Search Store (NOT basic files.upload!)
+    operation = await _start_upload(client, store_name, doc_path, size, upload_date)
+
+    # Wait for import to complete: poll fast at first (small documents
+    # import in well under 2s), backing off to POLL_MAX_DELAY. Time is read
+    # from the loop clock, so slow status calls count against max_wait too
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_wait
+    delay = POLL_INITIAL_DELAY
+    progress_task = asyncio.create_task(_report_progress(doc_path.name))
+    try:
+        while not operation.done:
+            if loop.time() >= deadline:
+                raise TimeoutError(f"Import timeout for {doc_path.name} after {max_wait}s")
+            await asyncio.sleep(delay)
+            operation = await _get_operation(client, operation)
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+    finally:
+        progress_task.cancel()
+
+    if operation.error:
+        raise RuntimeError(f"Import failed for {doc_path.name}: {operation.error}")
+
+    # Extract file metadata from operation result
+    return FileRecord(
+        name=doc_path.name,
+        document_name=operation.response.document_name if operation.response else None,
+        path=str(doc_path),
+        size=size,
+        imported_at=datetime.now().isoformat()
+    )
 
-        # Wait for import to complete
-        waited = 0
-        while not operation.done and waited < max_wait:
-            await asyncio.sleep(2)
-            operation = client.operations.get(operation)
-            waited += 2
 
-            if waited % 10 == 0:  # Progress update every 10s
-                print(f"      Importing... ({waited}s elapsed)")
+def build_corpus_metadata(
+    store_name: str,
+    corpus_name: str,
+    uploaded_files: List[FileRecord]
+) -> Dict:
+    """
+    Build corpus metadata for an uploaded knowledge base and print a summary.
 
-        if not operation.done:
-            raise TimeoutError(f"Import timeout for {doc_path.name} after {max_wait}s")
+    Args:
+        store_name: File Search Store name
+        corpus_name: Name for the knowledge base
+        uploaded_files: FileRecords from upload_document_to_store
+            (their recorded sizes are summed, no files are stat'ed)
 
-        if operation.error:
-            raise RuntimeError(f"Import failed for {doc_path.name}: {operation.error}")
+    Returns:
+        Corpus metadata dict with:
+        - file_search_store_name: Store resource name (CRITICAL for queries)
+        - files_indexed: Number of files uploaded
+        - storage_type: "File Search Store"
+        - storage_persistence: "Indefinite (until manually deleted)"
+        - created_at: ISO timestamp
+        - cost_estimate_usd: Estimated indexing cost
+    """
+    # Calculate cost estimate
+    total_size = sum(record.size for record in uploaded_files)
+    # Rough estimate: ~5 characters per token, $0.15 per 1M tokens
+    # (= 0.15 micro-dollars per token); integer math until display
+    estimated_tokens = total_size // 5
+    cost_estimate_micros = estimated_tokens * 15 // 100
+    cost_estimate = cost_estimate_micros / 1_000_000
 
-        # Extract file metadata from operation result
-        file_metadata = {
-            'name': doc_path.name,
-            'path': str(doc_path),
-            'size': doc_path.stat().st_size,
-            'imported_at': datetime.now().isoformat()
-        }
+    # Build corpus metadata
+    corpus_metadata = {
+        'file_search_store_name': store_name,  # CRITICAL - needed for queries
+        'corpus_name': corpus_name,
+        'files_indexed': len(uploaded_files),
+        'storage_type': 'File Search Store',
+        'storage_persistence': 'Indefinite (until manually deleted)',
+        'globally_accessible': True,  # Same API key from any client
+        'created_at': datetime.now().isoformat(),
+        'total_size_bytes': total_size,
+        'estimated_tokens': estimated_tokens,
+        'cost_estimate_usd': cost_estimate,  # Unrounded; format at display
+        'uploaded_files': [asdict(record) for record in uploaded_files[:10]]  # First 10 for reference
+    }
 
-        uploaded_files.append(file_metadata)
-        print(f"      ✅ Imported successfully")
+    logger.info("\n🎉 Knowledge base created successfully!")
+    logger.info("\n📊 Summary:")
+    logger.info("   Store name: %s", store_name)
+    logger.info("   Files indexed: %d", len(uploaded_files))
+    logger.info("   Total size: %.2f MB", total_size / (1024 * 1024))
+    logger.info("   Estimated tokens: %d", estimated_tokens)
+    logger.info("   Indexing cost: $%.4f", cost_estimate)
+    logger.info("\n💡 Query instructions:")
+    logger.info("   Use store name in your queries: %s", store_name)
+    logger.info("   Storage: FREE (no storage fees)")
+    logger.info("   Queries: Standard Gemini model pricing (~$0.002/query typical)")
 
-    print(f"\n✅ All {len(uploaded_files)} documents uploaded and imported")
-    return uploaded_files
+    return corpus_metadata
 
 
-async def upload_to_gemini(
+async def upload_stream_to_gemini(
     gemini_api_key: str,
-    document_paths: List[Path],
-    corpus_name: str
-) -> Dict:
+    document_queue: asyncio.Queue,
+    corpus_name: str,
+    max_concurrency: int = UPLOAD_CONCURRENCY,
+    store_name: Optional[str] = None,
+    uploaded_files: Optional[List[FileRecord]] = None
+) -> Optional[Dict]:
     """
-    Main function: Upload documents to Gemini File Search.
+    Upload documents to Gemini File Search as they are produced.
+
+    CRITICAL: Uses upload_to_file_search_store (persistent)
+    NOT files.upload (which deletes after 48h)
 
-    High-level workflow:
-    1. Initialize Gemini client
-    2. Create File Search Store (persistent container)
-    3. Upload all documents to the store
-    4. Return corpus metadata (includes store name for queries)
+    Consumes document paths from an asyncio.Queue until a None sentinel
+    arrives, so uploads overlap with scraping and conversion upstream.
+    The File Search Store is created lazily on the first document, so no
+    empty store is left behind when nothing was converted. Each document
+    is checked (exists, non-empty) before it is uploaded.
 
     Args:
         gemini_api_key: Google Gemini API key
-        document_paths: List of document file paths
+        document_queue: Queue of document paths, terminated by None
         corpus_name: Name for the knowledge base
+        max_concurrency: Maximum simultaneous uploads
+        store_name: Existing File Search Store to add documents to
+            (incremental runs); a new store is created if None
+        uploaded_files: Optional list that receives the FileRecord of every
+            uploaded file as it is imported, also when a later upload fails
+            (the corpus metadata only keeps the first 10)
 
     Returns:
-        Corpus metadata dict with:
-        - file_search_store_name: Store resource name (CRITICAL for queries)
-        - files_indexed: Number of files uploaded
-        - storage_type: "File Search Store"
-        - storage_persistence: "Indefinite (until manually deleted)"
-        - created_at: ISO timestamp
-        - cost_estimate: Estimated indexing cost
+        Corpus metadata dict (see build_corpus_metadata), or None if the
+        queue produced no documents
+
+    Raises:
+        FileNotFoundError: If a document is missing
+        ValueError: If a document is empty
+        TimeoutError: If an import takes longer than its max_wait
+        RuntimeError: If an import fails
 
     Example:
-        >>> docs = [Path("doc1.txt"), Path("doc2.txt")]
-        >>> corpus = await upload_to_gemini("api_key", docs, "my-docs")
+        >>> queue = asyncio.Queue()
+        >>> for doc in [Path("doc1.txt"), Path("doc2.txt"), None]:
+        ...     queue.put_nowait(doc)
+        >>> corpus = await upload_stream_to_gemini("api_key", queue, "my-docs")
         >>> print(corpus['file_search_store_name'])
         fileSearchStores/abc123xyz
 
@@ -195,88 +377,108 @@ async def upload_to_gemini(
         ...     )
         ... )
     """
-    # Initialize Gemini client
     client = genai.Client(api_key=gemini_api_key)
-
-    print(f"🧠 Gemini File Search Upload")
-    print(f"   Corpus: {corpus_name}")
-    print(f"   Documents: {len(document_paths)}")
-
-    # Create File Search Store
-    store_name = await create_file_search_store(
-        client=client,
-        store_name=corpus_name,
-        display_name=corpus_name
-    )
-
-    # Upload documents
-    uploaded_files = await upload_documents_to_store(
-        client=client,
+    semaphore = asyncio.Semaphore(max_concurrency)
+    document_paths = []
+    tasks = []
+    uploaded = False
+    upload_date = datetime.now().isoformat()
+
+    async def upload_one(doc_path: Path) -> FileRecord:
+        try:
+            size = await asyncio.to_thread(_validate_document, doc_path)
+            record = await upload_document_to_store(
+                client, store_name, doc_path, size=size, upload_date=upload_date
+            )
+            logger.debug("      ✅ Imported %s", doc_path.name)
+            # Recorded as soon as it's imported, so callers still learn about
+            # it if a later upload fails
+            if uploaded_files is not None:
+                uploaded_files.append(record)
+            return record
+        finally:
+            semaphore.release()
+
+    try:
+        while (doc_path := await document_queue.get()) is not None:
+            if not uploaded:
+                uploaded = True
+                logger.info("🧠 Gemini File Search Upload (streaming)")
+                logger.info("   Corpus: %s", corpus_name)
+                if store_name is None:
+                    store_name = await create_file_search_store(
+                        client=client,
+                        store_name=corpus_name,
+                        display_name=corpus_name
+                    )
+
+            # Acquire before spawning so the queue keeps backpressure
+            await semaphore.acquire()
+            logger.debug("   [%d] Uploading %s...", len(document_paths) + 1, doc_path.name)
+            tasks.append(asyncio.create_task(upload_one(doc_path)))
+            document_paths.append(doc_path)
+
+        results = list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    if not uploaded:
+        return None
+
+    return build_corpus_metadata(
         store_name=store_name,
-        document_paths=document_paths
+        corpus_name=corpus_name,
+        uploaded_files=results
     )
 
-    # Calculate cost estimate
-    total_size = sum(doc.stat().st_size for doc in document_paths)
-    # Rough estimate: ~5 characters per token, $0.15 per 1M tokens
-    estimated_tokens = total_size // 5
-    cost_estimate = (estimated_tokens / 1_000_000) * 0.15
 
-    # Build corpus metadata
-    corpus_metadata = {
-        'file_search_store_name': store_name,  # CRITICAL - needed for queries
-        'corpus_name': corpus_name,
-        'files_indexed': len(uploaded_files),
-        'storage_type': 'File Search Store',
-        'storage_persistence': 'Indefinite (until manually deleted)',
-        'globally_accessible': True,  # Same API key from any client
-        'created_at': datetime.now().isoformat(),
-        'total_size_bytes': total_size,
-        'estimated_tokens': estimated_tokens,
-        'cost_estimate_usd': round(cost_estimate, 4),
-        'uploaded_files': uploaded_files[:10]  # First 10 for reference
-    }
+async def delete_store_documents(
+    gemini_api_key: str,
+    document_names: List[str]
+) -> None:
+    """
+    Delete documents from a File Search Store (e.g. superseded versions).
 
-    print(f"\n🎉 Knowledge base created successfully!")
-    print(f"\n📊 Summary:")
-    print(f"   Store name: {store_name}")
-    print(f"   Files indexed: {len(uploaded_files)}")
-    print(f"   Total size: {total_size / 1024 / 1024:.2f} MB")
-    print(f"   Estimated tokens: {estimated_tokens:,}")
-    print(f"   Indexing cost: ${cost_estimate:.4f}")
-    print(f"\n💡 Query instructions:")
-    print(f"   Use store name in your queries: {store_name}")
-    print(f"   Storage: FREE (no storage fees)")
-    print(f"   Queries: Standard Gemini model pricing (~$0.002/query typical)")
+    Args:
+        gemini_api_key: Google Gemini API key
+        document_names: Document resource names
+            (format: "fileSearchStores/<id>/documents/<id>")
+    """
+    client = genai.Client(api_key=gemini_api_key)
 
-    return corpus_metadata
+    async def delete_one(document_name: str):
+        try:
+            await asyncio.to_thread(
+                client.file_search_stores.documents.delete,
+                name=document_name,
+                config={'force': True}  # Also delete the document's chunks
+            )
+        except errors.APIError as e:
+            # Stale copies only waste index space; never fail the run over them
+            logger.warning("   ⚠️  Could not delete %s: %s", document_name, e)
 
+    await asyncio.gather(*(delete_one(name) for name in document_names))
+    logger.info("🗑️  Deleted %d superseded documents", len(document_names))
 
-def generate_query_guide(
-    corpus_metadata: Dict,
-    output_path: Path
-) -> Path:
-    """
-    Generate a query guide showing how to use the knowledge base.
 
-    Creates a markdown file with:
-    - Python SDK example
-    - AI Studio instructions
-    - Mobile app instructions
-    - Cost information
+async def file_search_store_exists(gemini_api_key: str, store_name: str) -> bool:
+    """
+    Check whether a File Search Store still exists.
 
     Args:
-        corpus_metadata: Metadata dict from upload_to_gemini
-        output_path: Where to save the guide
+        gemini_api_key: Google Gemini API key
+        store_name: Store resource name (e.g., "fileSearchStores/abc123")
 
     Returns:
-        Path to created guide
+        False if the store was deleted (404), True otherwise
     """
-    store_name = corpus_metadata['file_search_store_name']
-    corpus_name = corpus_metadata['corpus_name']
-    files_count = corpus_metadata['files_indexed']
+    return await _store_exists(genai.Client(api_key=gemini_api_key), store_name)
+
 
-    guide = f"""# Query Guide: {corpus_name}
+# Query guide markdown; literal braces are doubled for str.format_map
+_GUIDE_TEMPLATE = """# Query Guide: {corpus_name}
 
 Your knowledge base has been created successfully!
 
@@ -445,18 +647,68 @@ Your knowledge base is **permanent** until you delete it:
 ---
 
 **Generated by:** Gemini Knowledge Scraper Actor
-**Created:** {corpus_metadata['created_at']}
+**Created:** {created_at}
 **Support:** Contact actor developer or check README
 """
 
-    output_path.write_text(guide, encoding='utf-8')
-    print(f"📖 Query guide created: {output_path}")
 
-    return output_path
+def generate_query_guide(
+    corpus_metadata: Dict,
+    output_path: Optional[Path] = None
+) -> str:
+    """
+    Generate a query guide showing how to use the knowledge base.
+
+    Builds markdown with:
+    - Python SDK example
+    - AI Studio instructions
+    - Mobile app instructions
+    - Cost information
+
+    Args:
+        corpus_metadata: Metadata dict from upload_stream_to_gemini
+        output_path: Where to save the guide (optional, not written if None)
+
+    Returns:
+        Guide markdown content
+    """
+    guide = _GUIDE_TEMPLATE.format_map({
+        'store_name': corpus_metadata['file_search_store_name'],
+        'corpus_name': corpus_metadata['corpus_name'],
+        'files_count': corpus_metadata['files_indexed'],
+        'created_at': corpus_metadata['created_at'],
+    })
+
+    if output_path is not None:
+        output_path.write_bytes(guide.encode('utf-8'))
+        logger.info("📖 Query guide created: %s", output_path)
+
+    return guide
 
 
 # ========== HELPER FUNCTIONS ==========
 
+def iter_file_search_stores(client: genai.Client) -> Iterator[Dict]:
+    """
+    Lazily yield File Search Stores for this API key.
+
+    The SDK pager fetches pages on demand, so stopping early (e.g. at the
+    first matching name) skips the remaining pages.
+
+    Args:
+        client: Initialized Gemini client
+
+    Yields:
+        Store metadata dicts (name, display_name, created_time)
+    """
+    for store in client.file_search_stores.list():
+        yield {
+            'name': store.name,
+            'display_name': store.display_name,
+            'created_time': store.create_time
+        }
+
+
 def list_file_search_stores(client: genai.Client) -> List[Dict]:
     """
     List all File Search Stores for this API key.
@@ -469,17 +721,7 @@ def list_file_search_stores(client: genai.Client) -> List[Dict]:
     Returns:
         List of store metadata dicts
     """
-    stores = client.file_search_stores.list()
-    store_list = []
-
-    for store in stores:
-        store_list.append({
-            'name': store.name,
-            'display_name': store.display_name,
-            'created_time': store.create_time
-        })
-
-    return store_list
+    return list(iter_file_search_stores(client))
 
 
 def delete_file_search_store(client: genai.Client, store_name: str):
@@ -493,4 +735,4 @@ def delete_file_search_store(client: genai.Client, store_name: str):
         store_name: Store resource name (e.g., "fileSearchStores/abc123")
     """
     client.file_search_stores.delete(name=store_name)
-    print(f"🗑️  Deleted File Search Store: {store_name}")
+    logger.info("🗑️  Deleted File Search Store: %s", store_name)
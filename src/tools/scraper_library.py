@@ -13,7 +13,9 @@ Categories:
 - AI-focused scrapers (optimized for RAG/LLM)
 """
 
-from typing import List, Dict
+from typing import Dict, Tuple
+from collections import defaultdict
+import math
 
 # ========== OFFICIAL APIFY SCRAPERS (FREE, HIGH QUALITY) ==========
 
@@ -113,16 +115,35 @@ COMMUNITY_AI_SCRAPERS = [
 
 # ========== COMBINED PRODUCTION LIBRARY ==========
 
-def get_scraper_library() -> List[Dict]:
+# Built once at import; the library is constant for the life of the process
+_ALL_SCRAPERS: Tuple[Dict, ...] = tuple(OFFICIAL_SCRAPERS + COMMUNITY_AI_SCRAPERS)
+
+_FAST_SPEEDS = frozenset({'very_fast', 'fast'})
+
+# Budget mode -> scrapers it allows
+_BY_BUDGET: Dict[str, Tuple[Dict, ...]] = {
+    # Only FREE scrapers, prioritize speed
+    'minimal': tuple(
+        s for s in _ALL_SCRAPERS if s['cost'] == 'free' and s['speed'] in _FAST_SPEEDS
+    ),
+    # FREE scrapers with good balance of speed and features
+    'optimal': tuple(s for s in _ALL_SCRAPERS if s['cost'] == 'free'),
+    # All scrapers, prioritize quality and features
+    'premium': _ALL_SCRAPERS,
+}
+
+
+def get_scraper_library() -> Tuple[Dict, ...]:
     """
     Get full production scraper library (Challenge-compliant only).
 
-    Returns list of scraper metadata for intelligent selection.
+    Returns an immutable tuple of scraper metadata for intelligent
+    selection (shared across calls - copy before mutating).
     """
-    return OFFICIAL_SCRAPERS + COMMUNITY_AI_SCRAPERS
+    return _ALL_SCRAPERS
 
 
-def get_scrapers_by_budget(budget_mode: str) -> List[Dict]:
+def get_scrapers_by_budget(budget_mode: str) -> Tuple[Dict, ...]:
     """
     Filter scrapers by budget preference.
 
@@ -130,24 +151,13 @@ def get_scrapers_by_budget(budget_mode: str) -> List[Dict]:
         budget_mode: 'minimal', 'optimal', or 'premium'
 
     Returns:
-        Filtered list of scrapers matching budget
+        Scrapers matching budget (precomputed, shared tuple; unknown
+        modes get the premium selection)
     """
-    all_scrapers = get_scraper_library()
+    return _BY_BUDGET.get(budget_mode, _BY_BUDGET['premium'])
 
-    if budget_mode == 'minimal':
-        # Only FREE scrapers, prioritize speed
-        return [s for s in all_scrapers if s['cost'] == 'free' and s['speed'] in ['very_fast', 'fast']]
 
-    elif budget_mode == 'optimal':
-        # FREE scrapers with good balance of speed and features
-        return [s for s in all_scrapers if s['cost'] == 'free']
-
-    else:  # premium
-        # All scrapers, prioritize quality and features
-        return all_scrapers
-
-
-def get_scrapers_by_target_type(target_type: str) -> List[Dict]:
+def get_scrapers_by_target_type(target_type: str) -> Tuple[Dict, ...]:
     """
     Filter scrapers by target type.
 
@@ -155,30 +165,23 @@ def get_scrapers_by_target_type(target_type: str) -> List[Dict]:
         target_type: 'documentation', 'blog', 'forum', 'news', 'general'
 
     Returns:
-        Scrapers best suited for target type
+        Scrapers best suited for target type (precomputed, shared tuple)
     """
-    all_scrapers = get_scraper_library()
-    return [s for s in all_scrapers if target_type in s['best_for']]
+    return _BY_TARGET.get(target_type, ())
 
 
-def score_scraper_production(scraper: Dict, budget_mode: str, target_type: str) -> float:
+def _base_score(scraper: Dict) -> float:
     """
-    Production scoring algorithm for scraper selection.
+    Score the parts of a scraper that don't depend on the request.
 
-    Factors:
-    - Success rate (40%)
-    - User popularity (20%)
-    - Cost efficiency (20%)
-    - Target type match (10%)
-    - Output format (10%)
+    Covers success rate (0-40), popularity (0-20), free cost (0/20) and
+    output format (0-10) - everything except the budget and target terms.
 
     Args:
         scraper: Scraper metadata dict
-        budget_mode: User's budget preference
-        target_type: Target website type
 
     Returns:
-        Score from 0-100 (higher = better)
+        Partial score (unrounded)
     """
     score = 0.0
 
@@ -186,7 +189,6 @@ def score_scraper_production(scraper: Dict, budget_mode: str, target_type: str)
     score += scraper['success_rate'] * 40
 
     # Popularity (0-20 points) - log scale
-    import math
     monthly_users = scraper['monthly_users']
     if monthly_users > 0:
         # Normalize: 1 user = 5 points, 1000 users = 15 points, 5000+ users = 20 points
@@ -196,12 +198,6 @@ def score_scraper_production(scraper: Dict, budget_mode: str, target_type: str)
     # Cost efficiency (0-20 points)
     if scraper['cost'] == 'free':
         score += 20
-    elif budget_mode == 'premium':
-        score += 10  # Willing to pay for premium scrapers
-
-    # Target type match (0-10 points)
-    if target_type in scraper['best_for']:
-        score += 10
 
     # Output format bonus (0-10 points)
     if scraper['output_format'] == 'markdown':
@@ -211,4 +207,68 @@ def score_scraper_production(scraper: Dict, budget_mode: str, target_type: str)
     elif scraper['output_format'] == 'html':
         score += 5
 
+    return score
+
+
+def score_scraper_production(scraper: Dict, budget_mode: str, target_type: str) -> float:
+    """
+    Production scoring algorithm for scraper selection.
+
+    Factors:
+    - Success rate (40%)
+    - User popularity (20%)
+    - Cost efficiency (20%)
+    - Target type match (10%)
+    - Output format (10%)
+
+    The target- and budget-independent part is precomputed at import
+    (see _base_score); only the two request-dependent terms are added here.
+
+    Paid scrapers score 0.0 in 'minimal' (free-only) mode without further
+    work, so they always sort below every free scraper.
+
+    Args:
+        scraper: Scraper metadata dict
+        budget_mode: User's budget preference
+        target_type: Target website type
+
+    Returns:
+        Score from 0-100 (higher = better)
+    """
+    if budget_mode == 'minimal' and scraper['cost'] != 'free':
+        return 0.0  # Excluded by budget
+
+    # Precomputed only for the library's own dicts (not copies/external ones)
+    entry = _BASE_SCORES.get(scraper['id'])
+    base = entry[1] if entry is not None and entry[0] is scraper else _base_score(scraper)
+
+    score = base
+    if scraper['cost'] != 'free' and budget_mode == 'premium':
+        score += 10  # Willing to pay for premium scrapers
+    if target_type in scraper['best_for']:
+        score += 10
+
     return round(score, 1)
+
+
+# ========== PRECOMPUTED INDEXES ==========
+
+# Target type -> scrapers best suited for it
+_BY_TARGET: Dict[str, Tuple[Dict, ...]] = {}
+
+# Actor ID -> (library scraper dict, base score); kept out of the public dicts
+_BASE_SCORES: Dict[str, Tuple[Dict, float]] = {}
+
+
+def _build_indexes() -> None:
+    """Precompute each scraper's base score and build the target-type index."""
+    by_target = defaultdict(list)
+    for scraper in _ALL_SCRAPERS:
+        _BASE_SCORES[scraper['id']] = (scraper, _base_score(scraper))
+        for target_type in scraper['best_for']:
+            by_target[target_type].append(scraper)
+
+    _BY_TARGET.update((t, tuple(scrapers)) for t, scrapers in by_target.items())
+
+
+_build_indexes()
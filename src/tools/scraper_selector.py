@@ -13,8 +13,11 @@ Banned categories (Section 2.3):
 - B2B platforms (Apollo)
 """
 
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 from apify_client import ApifyClient
+from operator import itemgetter
+import heapq
+import logging
 import re
 from .scraper_library import (
     get_scraper_library,
@@ -23,6 +26,16 @@ from .scraper_library import (
     score_scraper_production
 )
 
+try:
+    # Optional C Aho-Corasick automaton: one pass per text, however many
+    # patterns are banned (falls back to a compiled regex)
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+logger = logging.getLogger(__name__)
+
 
 # ========== BANNED PATTERNS (Challenge Compliance) ==========
 
@@ -50,6 +63,23 @@ BANNED_PATTERNS = [
     'apollo-io'
 ]
 
+# All banned patterns as one alternation, matched in a single scan
+_BANNED_RE = re.compile('|'.join(map(re.escape, BANNED_PATTERNS)), re.IGNORECASE)
+
+
+def _build_banned_automaton():
+    """Build an Aho-Corasick automaton over BANNED_PATTERNS (None if unavailable)."""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for pattern in BANNED_PATTERNS:
+        automaton.add_word(pattern.lower(), pattern)
+    automaton.make_automaton()
+    return automaton
+
+
+_BANNED_AUTOMATON = _build_banned_automaton()
+
 # Whitelist of known good scrapers (MVP - for integration testing)
 # Using website-content-crawler which is simple and doesn't require pageFunction
 KNOWN_SCRAPERS = [
@@ -82,19 +112,22 @@ def is_scraper_banned(actor: Dict) -> bool:
         >>> is_scraper_banned({'id': 'apify/web-scraper'})
         False
     """
-    # Combine all searchable text (case-insensitive)
-    actor_id = actor.get('id', '').lower()
-    title = actor.get('title', '').lower()
-    description = actor.get('description', '').lower()
+    # Short id first: nearly all banned actors are caught there, so the
+    # (possibly long) title/description is only scanned for the rest.
+    # Patterns contain no spaces, so no match can span two fields.
+    return (
+        _contains_banned(actor.get('id', ''))
+        or _contains_banned(actor.get('title', '') + ' ' + actor.get('description', ''))
+    )
 
-    searchable_text = f"{actor_id} {title} {description}"
 
-    # Check against all banned patterns
-    for pattern in BANNED_PATTERNS:
-        if pattern in searchable_text:
-            return True
+def _contains_banned(text: str) -> bool:
+    """Return True if text contains any banned pattern (case-insensitive)."""
+    if _BANNED_AUTOMATON is not None:
+        # iter() is lazy: stop at the first match
+        return next(_BANNED_AUTOMATON.iter(text.lower()), None) is not None
 
-    return False
+    return _BANNED_RE.search(text) is not None
 
 
 def filter_banned_scrapers(actors: List[Dict]) -> List[Dict]:
@@ -110,24 +143,77 @@ def filter_banned_scrapers(actors: List[Dict]) -> List[Dict]:
     Side effects:
         Logs each banned actor detected (for audit trail)
     """
-    allowed = []
-    banned_count = 0
-
-    for actor in actors:
-        if is_scraper_banned(actor):
-            banned_count += 1
-            # Log for audit (helps debug if false positives)
-            actor_id = actor.get('id', 'unknown')
-            print(f"🚫 Banned: {actor_id}")
-        else:
-            allowed.append(actor)
-
-    print(f"✅ Filtered {banned_count} banned scrapers, {len(allowed)} allowed")
+    allowed = [actor for actor in actors if not is_scraper_banned(actor)]
+    banned_count = len(actors) - len(allowed)
+
+    # Log for audit (helps debug if false positives), as one record; the
+    # common case of nothing banned skips this pass entirely
+    if banned_count and logger.isEnabledFor(logging.INFO):
+        logger.info("🚫 Banned: %s", ", ".join(
+            actor.get('id', 'unknown') for actor in actors if is_scraper_banned(actor)
+        ))
+
+    logger.info("✅ Filtered %d banned scrapers, %d allowed", banned_count, len(allowed))
     return allowed
 
 
 # ========== SCRAPER SCORING ==========
 
+# Shared read-only default for missing 'stats' (never mutated)
+_EMPTY: Dict = {}
+
+# Sort key for (score, actor) pairs (C-level, no Python frame per call)
+_SCORE_KEY = itemgetter(0)
+
+
+def _make_scorer(multiplier: float) -> Callable[[Dict], float]:
+    """
+    Build a score_scraper specialized for one budget mode.
+
+    The budget multiplier is bound once here instead of being re-derived
+    from budget_mode for every actor.
+
+    Args:
+        multiplier: Budget mode adjustment applied to the raw score
+
+    Returns:
+        Function scoring one actor from 0-100
+    """
+    def _score(actor: Dict) -> float:
+        score = 0.0
+        stats = actor.get('stats') or _EMPTY
+
+        # Base popularity score (runs_count)
+        runs = stats.get('totalRuns', 0)
+        if runs > 0:
+            runs_score = runs / 1000
+            score += runs_score if runs_score < 50 else 50  # Max 50 points
+
+        # Rating score (if available)
+        rating = actor.get('rating', 0)
+        if rating > 0:
+            score += rating * 10  # Max 50 points (5-star rating)
+
+        # Monthly users score
+        monthly_users = stats.get('monthlyUsers', 0)
+        if monthly_users > 0:
+            users_score = monthly_users / 10
+            score += users_score if users_score < 20 else 20  # Max 20 points
+
+        return min(score * multiplier, 100.0)
+
+    return _score
+
+
+# Budget mode adjustment
+# (In real implementation, would factor in pricing)
+_SCORERS: Dict[str, Callable[[Dict], float]] = {
+    'minimal': _make_scorer(0.9),   # Prefer free/cheap scrapers (would check pricing here)
+    'optimal': _make_scorer(1.0),
+    'premium': _make_scorer(1.2),   # Prefer high-quality scrapers (boost rating weight)
+}
+
+
 def score_scraper(actor: Dict, budget_mode: str = 'optimal') -> float:
     """
     Score a scraper based on quality metrics and budget mode.
@@ -145,33 +231,28 @@ def score_scraper(actor: Dict, budget_mode: str = 'optimal') -> float:
     Returns:
         Score from 0-100 (higher = better)
     """
-    score = 0.0
-
-    # Base popularity score (runs_count)
-    runs = actor.get('stats', {}).get('totalRuns', 0)
-    if runs > 0:
-        score += min(runs / 1000, 50)  # Max 50 points
+    return _SCORERS.get(budget_mode, _SCORERS['optimal'])(actor)
 
-    # Rating score (if available)
-    rating = actor.get('rating', 0)
-    if rating > 0:
-        score += rating * 10  # Max 50 points (5-star rating)
 
-    # Monthly users score
-    monthly_users = actor.get('stats', {}).get('monthlyUsers', 0)
-    if monthly_users > 0:
-        score += min(monthly_users / 10, 20)  # Max 20 points
-
-    # Budget mode adjustment
-    # (In real implementation, would factor in pricing)
-    if budget_mode == 'premium':
-        # Prefer high-quality scrapers (boost rating weight)
-        score *= 1.2
-    elif budget_mode == 'minimal':
-        # Prefer free/cheap scrapers (would check pricing here)
-        score *= 0.9
+def _rank_scrapers(
+    actors: List[Dict],
+    budget_mode: str,
+    target_type: str,
+    top_n: Optional[int] = None
+) -> List[Tuple[float, Dict]]:
+    """
+    Score each actor once and return (score, actor) pairs, best first.
 
-    return min(score, 100.0)
+    With top_n, only the best top_n are kept (heapq.nlargest, no full
+    sort). Ties keep input order either way, as before.
+    """
+    scored = (
+        (score_scraper_production(actor, budget_mode, target_type), actor)
+        for actor in actors
+    )
+    if top_n is not None:
+        return heapq.nlargest(top_n, scored, key=_SCORE_KEY)
+    return sorted(scored, key=_SCORE_KEY, reverse=True)
 
 
 def select_best_scrapers(
@@ -192,23 +273,26 @@ def select_best_scrapers(
     Returns:
         List of top N scrapers, sorted by score (descending)
     """
-    # Score all actors using production algorithm
-    scored = []
-    for actor in actors:
-        score = score_scraper_production(actor, budget_mode, target_type)
-        scored.append({
-            'actor': actor,
-            'score': score
-        })
+    return [actor for _, actor in _rank_scrapers(actors, budget_mode, target_type, top_n)]
 
-    # Sort by score (descending)
-    scored.sort(key=lambda x: x['score'], reverse=True)
 
-    # Return top N actors
-    return [item['actor'] for item in scored[:top_n]]
+# ========== TARGET CLASSIFICATION ==========
 
+# Substring patterns per target type, in priority order (first type wins)
+TARGET_PATTERNS = [
+    ('documentation', ['docs.', '/docs/', 'documentation', 'api.', 'developer.']),
+    ('blog', ['/blog/', 'blog.', 'medium.com', 'substack.com']),
+    ('forum', ['forum', 'reddit.com', 'stackoverflow.com', 'discourse']),
+    ('news', ['news', 'article', 'press', '/story/']),
+]
+
+# Flattened (substring, target_type) table, still in priority order
+_PATTERN_CATEGORY = [
+    (pattern, target_type)
+    for target_type, patterns in TARGET_PATTERNS
+    for pattern in patterns
+]
 
-# ========== TARGET CLASSIFICATION ==========
 
 def classify_target(url: str) -> str:
     """
@@ -221,28 +305,34 @@ def classify_target(url: str) -> str:
         Target type: 'documentation', 'blog', 'forum', 'ecommerce', 'news', 'general'
     """
     url_lower = url.lower()
+    return next(
+        (target_type for pattern, target_type in _PATTERN_CATEGORY if pattern in url_lower),
+        'general'
+    )
 
-    # Documentation patterns
-    if any(pattern in url_lower for pattern in ['docs.', '/docs/', 'documentation', 'api.', 'developer.']):
-        return 'documentation'
 
-    # Blog patterns
-    if any(pattern in url_lower for pattern in ['/blog/', 'blog.', 'medium.com', 'substack.com']):
-        return 'blog'
+# ========== PRECOMPUTED RANKINGS ==========
 
-    # Forum patterns
-    if any(pattern in url_lower for pattern in ['forum', 'reddit.com', 'stackoverflow.com', 'discourse']):
-        return 'forum'
+# CRITICAL: The production library is vetted once, at import, so selection
+# doesn't re-filter it per call. A banned entry is a bug in scraper_library:
+# fail loudly (not an assert, which python -O would strip)
+_BANNED_IN_LIBRARY = [actor['id'] for actor in get_scraper_library() if is_scraper_banned(actor)]
+if _BANNED_IN_LIBRARY:
+    raise RuntimeError(f"Scraper library contains banned scrapers: {', '.join(_BANNED_IN_LIBRARY)}")
 
-    # News patterns
-    if any(pattern in url_lower for pattern in ['news', 'article', 'press', '/story/']):
-        return 'news'
+BUDGET_MODES = ('minimal', 'optimal', 'premium')
+TARGET_TYPES = tuple(target_type for target_type, _ in TARGET_PATTERNS) + ('general',)
 
-    # Default to general web scraping
-    return 'general'
+# The production library is static, so its ranking for every
+# (budget_mode, target_type) pair is computed once at import
+_PRECOMPUTED_RANKINGS: Dict[Tuple[str, str], List[Tuple[float, Dict]]] = {
+    (budget_mode, target_type): _rank_scrapers(get_scraper_library(), budget_mode, target_type)
+    for budget_mode in BUDGET_MODES
+    for target_type in TARGET_TYPES
+}
 
 
-async def find_and_select_scrapers(
+def find_and_select_scrapers(
     apify_client: ApifyClient,
     target: str,
     budget_mode: str = 'optimal',
@@ -254,7 +344,8 @@ async def find_and_select_scrapers(
     Workflow:
     1. Classify target type
     2. Search Apify Store for relevant scrapers
-    3. Filter out banned scrapers (CRITICAL)
+    3. Filter out banned scrapers (CRITICAL; the static library is vetted
+       at import, filter_banned_scrapers is for dynamic Store listings)
     4. Score and rank scrapers
     5. Return top N with fallbacks
 
@@ -268,7 +359,7 @@ async def find_and_select_scrapers(
         Tuple of (selected_scrapers, target_type)
 
     Raises:
-        ValueError: If no allowed scrapers found after filtering
+        ValueError: If the scraper library is empty
     """
     # Classify target
     target_type = classify_target(target)
@@ -276,23 +367,31 @@ async def find_and_select_scrapers(
     # Get production scraper library (Challenge-compliant only)
     actors = get_scraper_library()
 
-    print(f"🔍 Production library: {len(actors)} Challenge-compliant scrapers")
-    print(f"   Target type: {target_type}")
-    print(f"   Budget mode: {budget_mode}")
-
-    # CRITICAL: Filter banned scrapers
-    allowed_actors = filter_banned_scrapers(actors)
-
-    if not allowed_actors:
-        raise ValueError(f"❌ No allowed scrapers found for target type '{target_type}'. All {len(actors)} scrapers were banned.")
-
-    # Select best scrapers using production scoring
-    selected = select_best_scrapers(allowed_actors, budget_mode, top_n, target_type)
-
-    print(f"✅ Selected {len(selected)} scrapers:")
-    for i, actor in enumerate(selected, 1):
-        actor_id = actor.get('id', 'unknown')
-        score = score_scraper_production(actor, budget_mode, target_type)
-        print(f"   {i}. {actor_id} (score: {score:.1f})")
+    logger.info(
+        "🔍 Production library: %d Challenge-compliant scrapers\n   Target type: %s\n   Budget mode: %s",
+        len(actors), target_type, budget_mode
+    )
+
+    if not actors:
+        raise ValueError(f"❌ No allowed scrapers found for target type '{target_type}'. The scraper library is empty.")
+
+    # Select best scrapers using production scoring (precomputed for the
+    # library; scores reused for the log below)
+    ranking = _PRECOMPUTED_RANKINGS.get((budget_mode, target_type))
+    if ranking is not None:
+        ranked = ranking[:top_n]
+    else:  # Unknown budget mode
+        ranked = _rank_scrapers(actors, budget_mode, target_type, top_n)
+    selected = [actor for _, actor in ranked]
+
+    # Normalize once so downstream code can index actor['id'] directly
+    for actor in selected:
+        actor.setdefault('id', 'unknown')
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("✅ Selected %d scrapers:\n%s", len(selected), "\n".join(
+            f"   {i}. {actor['id']} (score: {score:.1f})"
+            for i, (score, actor) in enumerate(ranked, 1)
+        ))
 
     return selected, target_type
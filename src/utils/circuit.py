@@ -0,0 +1,117 @@
+"""
+Circuit Breaker for Gemini Knowledge Scraper
+
+Tracks failures per backend (e.g. per scraper actor ID) so a backend that
+keeps failing is skipped immediately instead of being waited on again.
+
+States:
+- CLOSED: Calls allowed (normal operation)
+- OPEN: Calls rejected until recovery_seconds have passed
+- HALF_OPEN: One trial call allowed; success closes, failure re-opens.
+  Further calls are rejected while the trial is outstanding (a trial
+  whose outcome was never recorded expires after recovery_seconds)
+
+State is a plain JSON-serializable dict, so it can be persisted in a
+key-value store and carried across runs.
+"""
+
+from typing import Dict, Optional
+import time
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Per-key circuit breaker.
+
+    Example:
+        >>> breaker = CircuitBreaker.from_dict(saved_state)
+        >>> if breaker.allow('apify/web-scraper'):
+        ...     try:
+        ...         run_scraper()
+        ...         breaker.record_success('apify/web-scraper')
+        ...     except Exception:
+        ...         breaker.record_failure('apify/web-scraper')
+        >>> saved_state = breaker.to_dict()
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        recovery_seconds: float = 300,
+        state: Optional[Dict[str, Dict]] = None
+    ):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open a circuit
+            recovery_seconds: How long an open circuit rejects calls
+            state: Previously saved state (from to_dict)
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._circuits: Dict[str, Dict] = {
+            key: dict(circuit) for key, circuit in (state or {}).items()
+        }
+
+    @classmethod
+    def from_dict(cls, state: Optional[Dict[str, Dict]], **kwargs) -> 'CircuitBreaker':
+        """
+        Restore a breaker from state saved with to_dict.
+
+        Args:
+            state: Saved state (None starts with every circuit closed)
+            **kwargs: failure_threshold / recovery_seconds
+
+        Returns:
+            CircuitBreaker
+        """
+        return cls(state=state, **kwargs)
+
+    def state(self, key: str) -> str:
+        """Return the circuit state for key (CLOSED if never failed)."""
+        circuit = self._circuits.get(key)
+        return circuit['state'] if circuit else CLOSED
+
+    def allow(self, key: str) -> bool:
+        """
+        Check whether a call to key may proceed.
+
+        An open circuit past its recovery window moves to HALF_OPEN and
+        lets a single trial call through; further calls are rejected until
+        the trial's outcome is recorded.
+        """
+        circuit = self._circuits.get(key)
+        if circuit is None or circuit['state'] == CLOSED:
+            return True
+
+        # OPEN: opened_at is when it opened; HALF_OPEN: when the trial started
+        now = time.time()
+        if now - circuit['opened_at'] >= self.recovery_seconds:
+            circuit['state'] = HALF_OPEN
+            circuit['opened_at'] = now
+            return True
+
+        return False
+
+    def record_success(self, key: str) -> None:
+        """Close the circuit for key and reset its failure count."""
+        self._circuits.pop(key, None)
+
+    def record_failure(self, key: str) -> None:
+        """Count a failure; open the circuit at the threshold (or on a failed trial)."""
+        circuit = self._circuits.setdefault(
+            key, {'state': CLOSED, 'opened_at': None, 'failures': 0}
+        )
+        circuit['failures'] += 1
+
+        if circuit['state'] == HALF_OPEN or circuit['failures'] >= self.failure_threshold:
+            circuit['state'] = OPEN
+            circuit['opened_at'] = time.time()
+
+    def to_dict(self) -> Dict[str, Dict]:
+        """Return the state for persistence (see the state argument)."""
+        return {key: dict(circuit) for key, circuit in self._circuits.items()}
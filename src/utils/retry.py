@@ -0,0 +1,164 @@
+"""
+Retry helpers for Gemini Knowledge Scraper
+
+Retries transient failures (rate limits, 5xx, timeouts) of a single call
+with exponential backoff and full jitter, so a flaky upstream doesn't
+immediately count as a failed scraper, and concurrent callers hitting the
+same rate limit don't retry in lockstep.
+
+Key functions:
+- is_transient_error: Classify an exception as worth retrying
+- retry_call: Call a function, retrying transient errors
+- retry_async: Await a coroutine function, retrying transient errors
+- with_retry: Decorator form of retry_async
+"""
+
+from typing import Any, Awaitable, Callable, TypeVar
+import asyncio
+import functools
+import logging
+import random
+import re
+
+
+# Matches transient failures reported only through the error message
+_TRANSIENT_MESSAGE_RE = re.compile(r'\b429\b|rate.?limit|timed? ?out|timeout|\b5\d\d\b', re.I)
+
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Return True for errors worth retrying against the same backend.
+
+    HTTP errors carrying a status code (ApifyApiError.status_code,
+    google.genai APIError.code) are retried on 429 and 5xx only, so
+    auth/validation failures (other 4xx) fail fast.
+
+    Args:
+        error: Exception raised by the call
+
+    Returns:
+        True if the call should be retried
+    """
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None and isinstance(getattr(error, 'code', None), int):
+        status_code = error.code
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+
+    return bool(_TRANSIENT_MESSAGE_RE.search(str(error)))
+
+
+async def _backoff(error: Exception, attempt: int, max_attempts: int, base: float, cap: float) -> None:
+    """Sleep random.uniform(0, min(cap, base * 2**attempt)) before the next attempt."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    logger.warning("   ⚠️  Transient error (%s), retrying in %.1fs (attempt %d/%d)",
+                   error, delay, attempt + 2, max_attempts)
+    await asyncio.sleep(delay)
+
+
+async def retry_call(
+    func: Callable[..., Any],
+    *args: Any,
+    max_attempts: int = 3,
+    base: float = 1.0,
+    cap: float = 30.0,
+    predicate: Callable[[Exception], bool] = is_transient_error,
+    **kwargs: Any
+) -> Any:
+    """
+    Call func(*args, **kwargs), retrying transient errors.
+
+    Sleeps random.uniform(0, min(cap, base * 2**attempt)) between attempts
+    ("full jitter"), so concurrent callers don't retry in lockstep.
+
+    Args:
+        func: Function to call (synchronous)
+        max_attempts: Total attempts, including the first
+        base: Backoff base in seconds
+        cap: Maximum backoff in seconds
+        predicate: Decides whether an error is retried
+
+    Returns:
+        Return value of func
+
+    Raises:
+        The last exception, once attempts are exhausted or the error is
+        not transient
+    """
+    for attempt in range(max_attempts):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_attempts - 1 or not predicate(e):
+                raise
+            await _backoff(e, attempt, max_attempts, base, cap)
+
+
+async def retry_async(
+    func: Callable[..., Awaitable[T]],
+    *args: Any,
+    max_attempts: int = 3,
+    base: float = 1.0,
+    cap: float = 30.0,
+    predicate: Callable[[Exception], bool] = is_transient_error,
+    **kwargs: Any
+) -> T:
+    """
+    Await func(*args, **kwargs), retrying transient errors.
+
+    Async counterpart of retry_call (same backoff and arguments).
+
+    Args:
+        func: Coroutine function to call
+        max_attempts: Total attempts, including the first
+        base: Backoff base in seconds
+        cap: Maximum backoff in seconds
+        predicate: Decides whether an error is retried
+
+    Returns:
+        Return value of func
+
+    Raises:
+        The last exception, once attempts are exhausted or the error is
+        not transient
+    """
+    for attempt in range(max_attempts):
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_attempts - 1 or not predicate(e):
+                raise
+            await _backoff(e, attempt, max_attempts, base, cap)
+
+
+def with_retry(
+    max_attempts: int = 3,
+    base: float = 1.0,
+    cap: float = 30.0,
+    predicate: Callable[[Exception], bool] = is_transient_error
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """
+    Decorator: retry an async function on transient errors (see retry_async).
+
+    Example:
+        >>> @with_retry(max_attempts=5)
+        ... async def fetch(client, name):
+        ...     return await asyncio.to_thread(client.get, name=name)
+    """
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> T:
+            return await retry_async(
+                func, *args,
+                max_attempts=max_attempts, base=base, cap=cap, predicate=predicate,
+                **kwargs
+            )
+        return wrapper
+    return decorator
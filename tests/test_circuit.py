@@ -0,0 +1,158 @@
+"""
+Circuit Breaker Tests
+
+Test coverage:
+- State transitions (CLOSED -> OPEN -> HALF_OPEN -> CLOSED/OPEN)
+- Single trial call while HALF_OPEN
+- Persistence (to_dict / from_dict round trip)
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from utils import circuit
+from utils.circuit import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+KEY = 'apify/web-scraper'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() for the circuit module"""
+    now = [1000.0]
+    monkeypatch.setattr(circuit.time, 'time', lambda: now[0])
+    return now
+
+
+def open_breaker(clock):
+    """Return a breaker whose circuit for KEY has just opened"""
+    breaker = CircuitBreaker(failure_threshold=2, recovery_seconds=60)
+    breaker.record_failure(KEY)
+    breaker.record_failure(KEY)
+    return breaker
+
+
+# ========== STATE TRANSITIONS ==========
+
+class TestTransitions:
+    """Test CLOSED / OPEN / HALF_OPEN transitions"""
+
+    def test_new_key_closed(self):
+        """Keys that never failed are closed and allowed"""
+        breaker = CircuitBreaker()
+        assert breaker.state(KEY) == CLOSED
+        assert breaker.allow(KEY)
+
+    def test_below_threshold_stays_closed(self, clock):
+        """Failures below the threshold keep the circuit closed"""
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure(KEY)
+        assert breaker.state(KEY) == CLOSED
+        assert breaker.allow(KEY)
+
+    def test_threshold_opens(self, clock):
+        """Reaching the threshold opens the circuit and rejects calls"""
+        breaker = open_breaker(clock)
+        assert breaker.state(KEY) == OPEN
+        assert not breaker.allow(KEY)
+
+    def test_success_resets_failures(self, clock):
+        """A success clears the consecutive failure count"""
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure(KEY)
+        breaker.record_success(KEY)
+        breaker.record_failure(KEY)
+        assert breaker.state(KEY) == CLOSED
+
+    def test_recovery_moves_to_half_open(self, clock):
+        """After recovery_seconds a trial call is allowed"""
+        breaker = open_breaker(clock)
+        clock[0] += 60
+        assert breaker.allow(KEY)
+        assert breaker.state(KEY) == HALF_OPEN
+
+    def test_half_open_allows_single_trial(self, clock):
+        """Only one call gets through while the trial is outstanding"""
+        breaker = open_breaker(clock)
+        clock[0] += 60
+        assert breaker.allow(KEY)
+        assert not breaker.allow(KEY)
+        assert not breaker.allow(KEY)
+
+    def test_trial_success_closes(self, clock):
+        """A successful trial closes the circuit"""
+        breaker = open_breaker(clock)
+        clock[0] += 60
+        breaker.allow(KEY)
+        breaker.record_success(KEY)
+        assert breaker.state(KEY) == CLOSED
+        assert breaker.allow(KEY)
+
+    def test_trial_failure_reopens(self, clock):
+        """A failed trial re-opens the circuit for a full recovery window"""
+        breaker = open_breaker(clock)
+        clock[0] += 60
+        breaker.allow(KEY)
+        breaker.record_failure(KEY)
+        assert breaker.state(KEY) == OPEN
+        clock[0] += 59
+        assert not breaker.allow(KEY)
+
+    def test_abandoned_trial_expires(self, clock):
+        """A trial whose outcome was never recorded is retried later"""
+        breaker = open_breaker(clock)
+        clock[0] += 60
+        breaker.allow(KEY)
+        clock[0] += 60
+        assert breaker.allow(KEY)
+
+    def test_keys_independent(self, clock):
+        """One key's open circuit doesn't affect another"""
+        breaker = open_breaker(clock)
+        assert breaker.allow('apify/website-content-crawler')
+
+
+# ========== PERSISTENCE ==========
+
+class TestPersistence:
+    """Test saving and restoring state across runs"""
+
+    def test_round_trip(self, clock):
+        """from_dict(to_dict()) restores every circuit"""
+        breaker = open_breaker(clock)
+        breaker.record_failure('other')
+
+        restored = CircuitBreaker.from_dict(breaker.to_dict(), failure_threshold=2, recovery_seconds=60)
+        assert restored.to_dict() == breaker.to_dict()
+        assert restored.state(KEY) == OPEN
+        assert not restored.allow(KEY)
+        assert restored.state('other') == CLOSED
+
+    def test_round_trip_half_open(self, clock):
+        """An outstanding trial is still outstanding after a restore"""
+        breaker = open_breaker(clock)
+        clock[0] += 60
+        breaker.allow(KEY)
+
+        restored = CircuitBreaker.from_dict(breaker.to_dict(), recovery_seconds=60)
+        assert restored.state(KEY) == HALF_OPEN
+        assert not restored.allow(KEY)
+
+    def test_from_none(self):
+        """Missing saved state starts with every circuit closed"""
+        assert CircuitBreaker.from_dict(None).to_dict() == {}
+
+    def test_to_dict_is_copy(self, clock):
+        """Mutating saved state doesn't change the breaker"""
+        breaker = open_breaker(clock)
+        breaker.to_dict()[KEY]['state'] = CLOSED
+        assert breaker.state(KEY) == OPEN
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '--tb=short'])
@@ -0,0 +1,207 @@
+"""
+Document Converter Tests
+
+Test coverage:
+- Duplicate content filtering
+- Document filenames (store display names)
+- HTML extraction (text, title cascade, noise/ad removal) on both backends
+- Main content detection
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from tools import document_converter
+from tools.document_converter import (
+    item_content_hash,
+    document_filename,
+    DuplicateFilter,
+    clean_html_text,
+    extract_title,
+    extract_main_content
+)
+
+
+# ========== DUPLICATE FILTERING ==========
+
+class TestDuplicateFilter:
+    """Test content-hash deduplication of dataset items"""
+
+    def test_first_occurrence_kept(self):
+        """The first item with given content is not a duplicate"""
+        dedup = DuplicateFilter()
+        assert not dedup.is_duplicate(item_content_hash({'markdown': 'A'}))
+        assert dedup.duplicates == 0
+
+    def test_same_content_other_url(self):
+        """The same content under another URL is a duplicate"""
+        dedup = DuplicateFilter()
+        dedup.is_duplicate(item_content_hash({'url': 'https://a.com/', 'markdown': 'A'}))
+        assert dedup.is_duplicate(item_content_hash({'url': 'https://a.com/index', 'markdown': 'A'}))
+        assert dedup.duplicates == 1
+
+    def test_different_content_kept(self):
+        """Different content is never a duplicate"""
+        dedup = DuplicateFilter()
+        dedup.is_duplicate(item_content_hash({'markdown': 'A'}))
+        assert not dedup.is_duplicate(item_content_hash({'markdown': 'B'}))
+
+    def test_no_content_never_duplicate(self):
+        """Items without content (hash None) are left to the converter to skip"""
+        dedup = DuplicateFilter()
+        assert not dedup.is_duplicate(None)
+        assert not dedup.is_duplicate(None)
+        assert dedup.duplicates == 0
+
+
+# ========== DOCUMENT FILENAMES ==========
+
+class TestDocumentFilename:
+    """Test URL + content hash filenames (display names in a reused store)"""
+
+    HASH = 'a' * 32
+
+    def test_readable_slug(self):
+        """URL host and path become a readable slug"""
+        name = document_filename('https://docs.example.com/Guide/Intro', self.HASH, '.md')
+        assert name == 'docs-example-com-guide-intro-aaaaaaaaaaaa.md'
+
+    def test_stable_across_runs(self):
+        """Same URL and content give the same name (no per-run numbering)"""
+        url = 'https://example.com/a'
+        assert document_filename(url, self.HASH, '.txt') == document_filename(url, self.HASH, '.txt')
+
+    def test_changed_content_new_name(self):
+        """A re-indexed page gets a distinct name from its old copy"""
+        url = 'https://example.com/a'
+        assert document_filename(url, 'a' * 32, '.md') != document_filename(url, 'b' * 32, '.md')
+
+    def test_long_url_truncated(self):
+        """Very long URLs are cut to a bounded slug"""
+        name = document_filename('https://example.com/' + 'x' * 500, self.HASH, '.md')
+        assert len(name) <= 80 + 1 + 12 + 3
+
+    def test_url_without_path(self):
+        """Unparseable or empty URLs still get a name"""
+        assert document_filename('unknown-3', self.HASH, '.md') == 'unknown-3-aaaaaaaaaaaa.md'
+        assert document_filename('', self.HASH, '.md') == 'page-aaaaaaaaaaaa.md'
+
+
+# ========== HTML EXTRACTION ==========
+
+URL = 'https://example.com/docs/getting-started'
+
+# (html, expected title, expected text)
+EXTRACTION_FIXTURES = {
+    'pretty_printed': (
+        '<html><head><title> Page </title></head><body>\n  <p>a</p>\n  <p>b</p>\n</body></html>',
+        'Page', 'Page\na\nb'
+    ),
+    'noise_tags': (
+        '<body><nav>menu</nav><script>x = 1</script><style>.a {}</style>'
+        '<p>Keep <em>this</em></p><iframe>frame</iframe><noscript>ns</noscript><footer>f</footer></body>',
+        'Getting Started', 'Keep\nthis'
+    ),
+    'nested_ads': (
+        '<div class="sponsored"><div class="tracking"><p>t</p></div></div>'
+        '<div class="Ad-Container">buy</div><p>ok</p>',
+        'Getting Started', 'ok'
+    ),
+    'h1_title': (
+        '<body><h1>  Main <span>Title</span> </h1><p>x</p></body>',
+        'MainTitle', 'Main\nTitle\nx'
+    ),
+    'og_title': (
+        '<head><meta property="og:title" content=" OG Title "></head><body><p>y</p></body>',
+        'OG Title', 'y'
+    ),
+    'comment_splits_text': (
+        '<p>a<!-- note -->b</p>',
+        'Getting Started', 'a\nb'
+    ),
+    'blank_lines_collapsed': (
+        '<pre>line1\n\n\n\nline2   end</pre>',
+        'Getting Started', 'line1\n\nline2 end'
+    ),
+    'empty': ('', 'Getting Started', ''),
+}
+
+
+@pytest.fixture(params=['lexbor', 'lxml'])
+def backend(request, monkeypatch):
+    """Run a test with selectolax (if installed) and with the lxml fallback"""
+    if request.param == 'lexbor':
+        if document_converter.LexborHTMLParser is None:
+            pytest.skip('selectolax not installed')
+    else:
+        monkeypatch.setattr(document_converter, 'LexborHTMLParser', None)
+    return request.param
+
+
+class TestHtmlExtraction:
+    """Test that both parser backends extract the same text and title"""
+
+    @pytest.mark.parametrize('name', EXTRACTION_FIXTURES)
+    def test_text(self, backend, name):
+        """Clean text: one line per text node, noise and ads removed"""
+        html, _, expected = EXTRACTION_FIXTURES[name]
+        assert clean_html_text(html) == expected
+
+    @pytest.mark.parametrize('name', EXTRACTION_FIXTURES)
+    def test_title(self, backend, name):
+        """Title cascade: <title>, <h1>, og:title, URL basename"""
+        html, expected, _ = EXTRACTION_FIXTURES[name]
+        assert extract_title(html, URL) == expected
+
+    @pytest.mark.parametrize('name', EXTRACTION_FIXTURES)
+    def test_backends_agree(self, name):
+        """selectolax output is identical to the lxml fallback"""
+        if document_converter.LexborHTMLParser is None:
+            pytest.skip('selectolax not installed')
+        html = EXTRACTION_FIXTURES[name][0]
+        lexbor = document_converter._parse_and_extract(html, URL)
+        parser = document_converter.LexborHTMLParser
+        document_converter.LexborHTMLParser = None
+        try:
+            assert document_converter._parse_and_extract(html, URL) == lexbor
+        finally:
+            document_converter.LexborHTMLParser = parser
+
+
+class TestExtractMainContent:
+    """Test main content area detection"""
+
+    def test_main_tag(self):
+        """<main> wins over other candidates"""
+        node = extract_main_content('<body><article>a</article><main>m</main></body>')
+        assert node.name == 'main'
+
+    def test_article_tag(self):
+        """<article> is used without <main>"""
+        node = extract_main_content('<body><div class="content">c</div><article>a</article></body>')
+        assert node.name == 'article'
+
+    def test_content_class(self):
+        """Content class names match case-insensitively"""
+        node = extract_main_content('<body><div class="Post-Content">c</div></body>')
+        assert node.get_text() == 'c'
+
+    def test_body_fallback(self):
+        """Falls back to <body> and returns a node, not HTML"""
+        node = extract_main_content('<body><p>x</p></body>')
+        assert node.name == 'body'
+        assert node.get_text(strip=True) == 'x'
+
+    def test_parsed_tree_accepted(self):
+        """An already-parsed tree is searched without re-parsing"""
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup('<body><main>m</main></body>', 'lxml')
+        assert extract_main_content(soup) is soup.find('main')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '--tb=short'])
@@ -0,0 +1,44 @@
+"""
+Gemini Uploader Tests
+
+Test coverage:
+- Document validation before upload (missing, empty files)
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add repo root to path: the uploader uses package-relative imports (src.utils)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.tools.gemini_uploader import _validate_document
+
+
+# ========== DOCUMENT VALIDATION ==========
+
+class TestValidateDocument:
+    """Test the exists/non-empty check run before each upload"""
+
+    def test_valid_document_size(self, tmp_path):
+        """Valid documents return their size in bytes"""
+        doc = tmp_path / 'doc.txt'
+        doc.write_text('hello')
+        assert _validate_document(doc) == 5
+
+    def test_missing_document(self, tmp_path):
+        """Missing documents raise FileNotFoundError naming the path"""
+        doc = tmp_path / 'missing.txt'
+        with pytest.raises(FileNotFoundError, match='missing.txt'):
+            _validate_document(doc)
+
+    def test_empty_document(self, tmp_path):
+        """Empty documents raise ValueError naming the path"""
+        doc = tmp_path / 'empty.txt'
+        doc.touch()
+        with pytest.raises(ValueError, match='empty.txt'):
+            _validate_document(doc)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '--tb=short'])
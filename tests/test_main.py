@@ -0,0 +1,548 @@
+"""
+Main Pipeline Tests
+
+Test coverage:
+- Incremental manifest (unchanged pages, legacy hash upgrade, stale documents)
+- Manifest store verification (deleted File Search Store)
+- Circuit breaker recording in scraper fallback
+- Scrape cache (TTL hit/miss, disabled cache, deleted datasets)
+- Convert/upload pipeline deduplication
+- Manifest entries recorded when a run fails part-way
+- Converter process pool sizing
+"""
+
+import hashlib
+import pytest
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+# Add repo root to path: main uses package-relative imports (src.main)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from google.genai import errors
+
+from src import main
+from src.tools import gemini_uploader
+from src.tools.document_converter import item_content_hash, CONTENT_HASH_ALGO
+from src.utils import retry
+from src.utils.circuit import CircuitBreaker
+
+
+class FakeStores:
+    """Fake client.file_search_stores: knows a fixed set of store names"""
+
+    def __init__(self, existing):
+        self.existing = set(existing)
+
+    def get(self, name):
+        if name not in self.existing:
+            raise errors.ClientError(404, {'error': {'code': 404, 'message': 'not found', 'status': 'NOT_FOUND'}})
+        return types.SimpleNamespace(name=name)
+
+
+def fake_client_factory(existing):
+    """Build a genai.Client replacement whose stores are `existing`"""
+    def factory(api_key=None):
+        return types.SimpleNamespace(file_search_stores=FakeStores(existing))
+    return factory
+
+
+# ========== MANIFEST: UNCHANGED PAGES ==========
+
+class TestIsUnchangedPage:
+    """Test change detection against previous-run manifest entries"""
+
+    ITEM = {'url': 'https://example.com/a', 'markdown': '# A\n\nBody'}
+
+    def test_current_algo_unchanged(self):
+        """Same content hash with the current algorithm is unchanged"""
+        content_hash = item_content_hash(self.ITEM)
+        known = {'content_hash': content_hash, 'hash_algo': CONTENT_HASH_ALGO, 'document_name': 'docs/1'}
+        assert main._is_unchanged_page(known, self.ITEM, content_hash)
+
+    def test_changed_content(self):
+        """Different content is re-indexed and the entry is left untouched"""
+        known = {'content_hash': 'old', 'hash_algo': CONTENT_HASH_ALGO, 'document_name': 'docs/1'}
+        assert not main._is_unchanged_page(known, self.ITEM, item_content_hash(self.ITEM))
+        assert known['content_hash'] == 'old'
+
+    def test_not_indexed_is_changed(self):
+        """Entries without a document name (upload never finished) are re-indexed"""
+        content_hash = item_content_hash(self.ITEM)
+        known = {'content_hash': content_hash, 'hash_algo': CONTENT_HASH_ALGO, 'document_name': None}
+        assert not main._is_unchanged_page(known, self.ITEM, content_hash)
+
+    def test_unknown_page(self):
+        """Pages missing from the manifest are new"""
+        assert not main._is_unchanged_page(None, self.ITEM, item_content_hash(self.ITEM))
+
+    def test_legacy_sha256_upgraded(self):
+        """Unchanged legacy SHA-256 entries are upgraded in place to blake2b"""
+        legacy = hashlib.sha256(self.ITEM['markdown'].encode('utf-8')).hexdigest()
+        known = {'sha256': legacy, 'document_name': 'docs/1'}
+        content_hash = item_content_hash(self.ITEM)
+
+        assert main._is_unchanged_page(known, self.ITEM, content_hash)
+        assert known == {
+            'content_hash': content_hash,
+            'hash_algo': CONTENT_HASH_ALGO,
+            'document_name': 'docs/1'
+        }
+
+    def test_legacy_sha256_changed(self):
+        """Changed legacy entries are re-indexed, not upgraded"""
+        known = {'sha256': hashlib.sha256(b'old').hexdigest(), 'document_name': 'docs/1'}
+        assert not main._is_unchanged_page(known, self.ITEM, item_content_hash(self.ITEM))
+        assert 'sha256' in known
+
+
+# ========== MANIFEST: STALE DOCUMENTS ==========
+
+class TestStaleDocuments:
+    """Test which previous-run documents are deleted after re-indexing"""
+
+    def test_reindexed_page_is_stale(self):
+        """A page re-indexed this run supersedes its old document"""
+        known = {'a': {'document_name': 'docs/old-a'}}
+        pages = {'a': {'document_name': 'docs/new-a'}}
+        assert main._stale_documents(known, pages) == ['docs/old-a']
+
+    def test_unchanged_page_is_kept(self):
+        """Unchanged pages reuse the manifest entry object, so nothing is deleted"""
+        entry = {'document_name': 'docs/a'}
+        assert main._stale_documents({'a': entry}, {'a': entry}) == []
+
+    def test_unseen_page_is_kept(self):
+        """Pages not scraped this run (e.g. lower max_pages) stay indexed"""
+        known = {'a': {'document_name': 'docs/a'}}
+        assert main._stale_documents(known, {}) == []
+
+    def test_never_indexed_page_skipped(self):
+        """Old entries without a document name have nothing to delete"""
+        known = {'a': {'document_name': None}}
+        pages = {'a': {'document_name': 'docs/new-a'}}
+        assert main._stale_documents(known, pages) == []
+
+    def test_unfinished_upload_keeps_old(self):
+        """The old document stays until its replacement was uploaded"""
+        known = {'a': {'document_name': 'docs/old-a'}}
+        pages = {'a': {'document_name': None}}
+        assert main._stale_documents(known, pages) == []
+
+
+class TestMergePages:
+    """Test merging this run's manifest entries into the previous run's"""
+
+    def test_new_and_reindexed_pages(self):
+        """New and re-indexed pages replace previous entries"""
+        known = {'a': {'document_name': 'docs/old-a'}, 'b': {'document_name': 'docs/b'}}
+        pages = {'a': {'document_name': 'docs/new-a'}, 'c': {'document_name': 'docs/c'}}
+        assert main._merge_pages(known, pages) == {
+            'a': {'document_name': 'docs/new-a'},
+            'b': {'document_name': 'docs/b'},
+            'c': {'document_name': 'docs/c'}
+        }
+
+    def test_unfinished_upload_keeps_previous_entry(self):
+        """A page whose new upload never finished keeps its indexed copy"""
+        known = {'a': {'document_name': 'docs/old-a'}}
+        assert main._merge_pages(known, {'a': {'document_name': None}}) == known
+
+
+# ========== MANIFEST: STORE VERIFICATION ==========
+
+class TestVerifyManifestStore:
+    """Test falling back to a new store when the manifest's store is gone"""
+
+    MANIFEST = {'store_name': 'fileSearchStores/abc', 'pages': {'a': {'document_name': 'docs/a'}}}
+
+    @pytest.mark.asyncio
+    async def test_existing_store_keeps_manifest(self, monkeypatch):
+        """Manifest is used when its store still exists"""
+        monkeypatch.setattr(gemini_uploader.genai, 'Client', fake_client_factory(['fileSearchStores/abc']))
+        assert await main._verify_manifest_store(self.MANIFEST, 'key') is self.MANIFEST
+
+    @pytest.mark.asyncio
+    async def test_deleted_store_drops_manifest(self, monkeypatch):
+        """A deleted store drops the manifest (new store, all pages re-indexed)"""
+        monkeypatch.setattr(gemini_uploader.genai, 'Client', fake_client_factory([]))
+        assert await main._verify_manifest_store(self.MANIFEST, 'key') is None
+
+    @pytest.mark.asyncio
+    async def test_no_manifest(self, monkeypatch):
+        """First runs don't call the API at all"""
+        def fail(api_key=None):
+            raise AssertionError("client created without a manifest")
+        monkeypatch.setattr(gemini_uploader.genai, 'Client', fail)
+        assert await main._verify_manifest_store(None, 'key') is None
+
+
+# ========== SCRAPER FALLBACK: CIRCUIT BREAKER ==========
+
+class FakeApifyClient:
+    """Fake ApifyClient: actor().start raises `error`, run().wait_for_finish
+    raises `wait_errors` in turn, otherwise the run's dataset holds `items`"""
+
+    def __init__(self, error=None, items=(), wait_errors=()):
+        self.error = error
+        self.items = list(items)
+        self.wait_errors = list(wait_errors)
+        self.starts = 0
+        self.waits = 0
+
+    def actor(self, actor_id):
+        return types.SimpleNamespace(start=self._start)
+
+    def _start(self, run_input=None):
+        self.starts += 1
+        if self.error is not None:
+            raise self.error
+        return {'id': 'run1', 'defaultDatasetId': 'ds1'}
+
+    def run(self, run_id):
+        return types.SimpleNamespace(wait_for_finish=self._wait)
+
+    def _wait(self):
+        self.waits += 1
+        if self.wait_errors:
+            raise self.wait_errors.pop(0)
+        return {'id': 'run1', 'status': 'SUCCEEDED', 'defaultDatasetId': 'ds1'}
+
+    def dataset(self, dataset_id):
+        return types.SimpleNamespace(iterate_items=lambda: iter(self.items))
+
+
+class TestScraperBreaker:
+    """Test which scraper outcomes count against the circuit breaker"""
+
+    SCRAPERS = [{'id': 'apify/web-scraper'}]
+
+    async def run(self, client, breaker):
+        return await main.execute_scraper_with_fallback(
+            client, self.SCRAPERS, 'https://example.com', 10, breaker=breaker
+        )
+
+    @pytest.mark.asyncio
+    async def test_transient_error_recorded(self, monkeypatch):
+        """Transient errors (after retries) count as failures"""
+        monkeypatch.setattr(main, 'retry_call', self.no_retry)
+        breaker = CircuitBreaker(failure_threshold=1)
+        result = await self.run(FakeApifyClient(error=TimeoutError('timed out')), breaker)
+        assert not result['success']
+        assert not breaker.allow('apify/web-scraper')
+
+    @pytest.mark.asyncio
+    async def test_non_transient_error_ignored(self):
+        """Bad input / auth errors don't open the circuit"""
+        breaker = CircuitBreaker(failure_threshold=1)
+        result = await self.run(FakeApifyClient(error=ValueError('invalid input')), breaker)
+        assert not result['success']
+        assert breaker.to_dict() == {}
+
+    @pytest.mark.asyncio
+    async def test_empty_dataset_is_success(self):
+        """An empty dataset resets the failure count instead of opening the circuit"""
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure('apify/web-scraper')
+        result = await self.run(FakeApifyClient(items=[]), breaker)
+        assert not result['success']
+        assert breaker.to_dict() == {}
+
+    @pytest.mark.asyncio
+    async def test_failed_wait_does_not_restart_run(self, monkeypatch):
+        """A transient error while waiting retries the wait, not the run start"""
+        monkeypatch.setattr(retry.asyncio, 'sleep', self.no_sleep)
+        client = FakeApifyClient(items=[{'markdown': 'A'}], wait_errors=[TimeoutError('timed out')])
+        result = await self.run(client, CircuitBreaker())
+        assert result['success']
+        assert client.starts == 1
+        assert client.waits == 2
+
+    @staticmethod
+    async def no_retry(func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    @staticmethod
+    async def no_sleep(delay):
+        pass
+
+
+# ========== SCRAPE CACHE ==========
+
+class FakeKeyValueStore:
+    """Fake Apify key-value store (async get_value / set_value)"""
+
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+
+    async def get_value(self, key):
+        return self.values.get(key)
+
+    async def set_value(self, key, value):
+        self.values[key] = value
+
+
+class FakeDatasetClient:
+    """Fake Apify client with named datasets; every actor run creates 'fresh'"""
+
+    def __init__(self, datasets):
+        self.datasets = datasets
+        self.runs = 0
+
+    def actor(self, actor_id):
+        return types.SimpleNamespace(start=self._start)
+
+    def _start(self, run_input=None):
+        self.runs += 1
+        self.datasets['fresh'] = [{'url': 'https://example.com', 'markdown': 'fresh'}]
+        return {'id': 'run-fresh'}
+
+    def run(self, run_id):
+        return types.SimpleNamespace(wait_for_finish=lambda: {'id': run_id, 'defaultDatasetId': 'fresh'})
+
+    def dataset(self, dataset_id):
+        return types.SimpleNamespace(
+            get=lambda: {'id': dataset_id} if dataset_id in self.datasets else None,
+            iterate_items=lambda: iter(self.datasets[dataset_id])
+        )
+
+
+class TestScrapeCache:
+    """Test reuse of recent scrapes of the same target and max_pages"""
+
+    TARGET = 'https://example.com'
+    NOW = 1_000_000.0
+
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        monkeypatch.setattr(main.time, 'time', lambda: self.NOW)
+
+    def cached_store(self, age, dataset_id='cached'):
+        key = main._scrape_cache_key(self.TARGET, 10)
+        return FakeKeyValueStore({key: {
+            'ts': self.NOW - age, 'dataset_id': dataset_id, 'scraper_used': 'apify/web-scraper'
+        }})
+
+    async def run(self, client, store, ttl):
+        result = await main.execute_scraper_cached(
+            client, store, ttl,
+            selected_scrapers=[{'id': 'apify/web-scraper'}],
+            target=self.TARGET,
+            max_pages=10
+        )
+        return result, list(result['data'] or [])
+
+    @pytest.mark.asyncio
+    async def test_hit_within_ttl(self):
+        """A recent entry re-reads its dataset without running a scraper"""
+        client = FakeDatasetClient({'cached': [{'markdown': 'cached'}]})
+        result, items = await self.run(client, self.cached_store(age=60), ttl=3600)
+        assert client.runs == 0
+        assert result['dataset_id'] == 'cached'
+        assert items == [{'markdown': 'cached'}]
+
+    @pytest.mark.asyncio
+    async def test_miss_after_ttl(self):
+        """An expired entry is ignored and replaced by the new scrape"""
+        client = FakeDatasetClient({'cached': [{'markdown': 'cached'}]})
+        store = self.cached_store(age=7200)
+        result, _ = await self.run(client, store, ttl=3600)
+        assert client.runs == 1
+        assert result['dataset_id'] == 'fresh'
+        assert store.values[main._scrape_cache_key(self.TARGET, 10)]['dataset_id'] == 'fresh'
+
+    @pytest.mark.asyncio
+    async def test_ttl_zero_disables_cache(self):
+        """ttl=0 neither reads nor writes cache entries"""
+        client = FakeDatasetClient({'cached': [{'markdown': 'cached'}]})
+        store = self.cached_store(age=0)
+        before = dict(store.values)
+        result, _ = await self.run(client, store, ttl=0)
+        assert client.runs == 1
+        assert result['dataset_id'] == 'fresh'
+        assert store.values == before
+
+    @pytest.mark.asyncio
+    async def test_deleted_dataset_is_miss(self):
+        """A hit whose dataset no longer exists scrapes again"""
+        client = FakeDatasetClient({})
+        result, _ = await self.run(client, self.cached_store(age=60), ttl=3600)
+        assert client.runs == 1
+        assert result['dataset_id'] == 'fresh'
+
+
+# ========== CONVERT / UPLOAD PIPELINE ==========
+
+class FakeUploadClient:
+    """Fake genai.Client: imports complete immediately, uploads are recorded"""
+
+    uploads = []
+
+    def __init__(self, api_key=None):
+        self.file_search_stores = types.SimpleNamespace(
+            create=lambda config: types.SimpleNamespace(name='fileSearchStores/test'),
+            upload_to_file_search_store=self._upload
+        )
+        self.operations = types.SimpleNamespace(get=lambda operation: operation)
+
+    def _upload(self, file, file_search_store_name, config):
+        self.uploads.append(file)
+        return types.SimpleNamespace(
+            done=True,
+            error=None,
+            response=types.SimpleNamespace(document_name=f"{file_search_store_name}/documents/{len(self.uploads)}")
+        )
+
+
+class TestPipelineDedup:
+    """Test that identical pages are converted and uploaded once"""
+
+    @pytest.mark.asyncio
+    async def test_duplicate_items_uploaded_once(self, monkeypatch, tmp_path):
+        """The same page under two URLs yields a single upload"""
+        FakeUploadClient.uploads = []
+        monkeypatch.setattr(gemini_uploader.genai, 'Client', FakeUploadClient)
+        items = [
+            {'url': 'https://example.com/', 'markdown': '# Home\n\nWelcome.'},
+            {'url': 'https://example.com/index.html', 'markdown': '# Home\n\nWelcome.'},
+        ]
+
+        documents, _, pages_count, corpus, pages = await main.convert_and_upload_pipeline(
+            iter(items), tmp_path, 'key', 'test-corpus'
+        )
+
+        assert pages_count == 2
+        assert len(documents) == 1
+        assert len(FakeUploadClient.uploads) == 1
+        assert corpus['files_indexed'] == 1
+        assert list(pages) == ['https://example.com/']
+        assert pages['https://example.com/']['document_name'] == 'fileSearchStores/test/documents/1'
+
+
+# ========== PARTIAL RUNS ==========
+
+class FailingUploadClient(FakeUploadClient):
+    """Fake genai.Client whose 'broken' document fails after another one was imported"""
+
+    first_imported = threading.Event()
+    deleted = []
+
+    def __init__(self, api_key=None):
+        super().__init__(api_key)
+        self.file_search_stores.documents = types.SimpleNamespace(
+            delete=lambda name, config: self.deleted.append(name)
+        )
+
+    def _upload(self, file, file_search_store_name, config):
+        if 'broken' not in file:
+            operation = super()._upload(file, file_search_store_name, config)
+            self.first_imported.set()
+            return operation
+        # Fail only once the other document's import was recorded
+        self.first_imported.wait(timeout=5)
+        time.sleep(0.2)
+        raise errors.ClientError(400, {'error': {'code': 400, 'message': 'bad document', 'status': 'INVALID_ARGUMENT'}})
+
+
+class TestPartialRun:
+    """Test that uploads made before a failure are recorded"""
+
+    @pytest.fixture(autouse=True)
+    def client(self, monkeypatch):
+        FakeUploadClient.uploads = []
+        FailingUploadClient.first_imported = threading.Event()
+        FailingUploadClient.deleted = []
+        monkeypatch.setattr(gemini_uploader.genai, 'Client', FailingUploadClient)
+
+    @pytest.mark.asyncio
+    async def test_pipeline_failure_keeps_uploaded_pages(self, tmp_path):
+        """pages holds the documents imported before an upload failed"""
+        items = [
+            {'url': 'https://example.com/ok', 'markdown': '# OK\n\nFine.'},
+            {'url': 'https://example.com/broken', 'markdown': '# Broken\n\nFails.'},
+        ]
+        pages = {}
+
+        with pytest.raises(errors.ClientError):
+            await main.convert_and_upload_pipeline(iter(items), tmp_path, 'key', 'test-corpus', pages=pages)
+
+        assert pages['https://example.com/ok']['document_name'] == 'fileSearchStores/test/documents/1'
+        assert pages['https://example.com/broken']['document_name'] is None
+
+    @pytest.mark.asyncio
+    async def test_partial_manifest_saved(self):
+        """A failed incremental run records its uploads and drops superseded copies"""
+        store = FakeKeyValueStore()
+        manifest = {'store_name': 'fileSearchStores/s', 'corpus': {'corpus_name': 'c'}, 'pages': {}}
+        known = {
+            'a': {'document_name': 'fileSearchStores/s/documents/old-a'},
+            'b': {'document_name': 'fileSearchStores/s/documents/old-b'}
+        }
+        pages = {
+            'a': {'document_name': 'fileSearchStores/s/documents/new-a'},
+            'b': {'document_name': None}
+        }
+
+        await main._save_partial_manifest(store, 'manifest-c', manifest, 'https://example.com', known, pages, 'key')
+
+        assert FailingUploadClient.deleted == ['fileSearchStores/s/documents/old-a']
+        assert store.values['manifest-c'] == {
+            'target': 'https://example.com',
+            'store_name': 'fileSearchStores/s',
+            'corpus': {'corpus_name': 'c'},
+            'pages': {
+                'a': {'document_name': 'fileSearchStores/s/documents/new-a'},
+                'b': {'document_name': 'fileSearchStores/s/documents/old-b'}
+            }
+        }
+
+    @pytest.mark.asyncio
+    async def test_partial_manifest_new_store(self):
+        """A failed first run records the store its documents went into"""
+        store = FakeKeyValueStore()
+        pages = {'a': {'document_name': 'fileSearchStores/new/documents/1'}}
+
+        await main._save_partial_manifest(store, 'manifest-c', None, 'https://example.com', {}, pages, 'key')
+
+        assert store.values['manifest-c']['store_name'] == 'fileSearchStores/new'
+        assert store.values['manifest-c']['corpus'] is None
+
+    @pytest.mark.asyncio
+    async def test_nothing_uploaded_nothing_saved(self):
+        """Failures before any upload leave the previous manifest untouched"""
+        store = FakeKeyValueStore()
+        await main._save_partial_manifest(store, 'manifest-c', None, 'https://example.com', {}, {'a': {'document_name': None}}, 'key')
+        assert store.values == {}
+
+
+# ========== CONVERTER POOL ==========
+
+class TestConverterPool:
+    """Test converter process pool sizing and start method"""
+
+    def test_affinity_not_host_count(self, monkeypatch):
+        """CPUs come from the affinity mask, not the host CPU count"""
+        monkeypatch.setattr(main.os, 'sched_getaffinity', lambda pid: {0, 1}, raising=False)
+        monkeypatch.setattr(main.os, 'cpu_count', lambda: 64)
+        assert main._available_cpus() == 2
+
+    def test_no_affinity_support(self, monkeypatch):
+        """Platforms without sched_getaffinity fall back to cpu_count"""
+        monkeypatch.delattr(main.os, 'sched_getaffinity', raising=False)
+        monkeypatch.setattr(main.os, 'cpu_count', lambda: 3)
+        assert main._available_cpus() == 3
+
+    def test_workers_capped(self):
+        """The pool never exceeds the cap, whatever the machine"""
+        assert 1 <= main.CONVERTER_WORKERS <= main.CONVERTER_WORKERS_MAX
+
+    def test_not_forked(self):
+        """Workers are never forked from the multithreaded event loop process"""
+        assert main.CONVERTER_START_METHOD in ('forkserver', 'spawn')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '--tb=short'])
@@ -0,0 +1,229 @@
+"""
+Retry Helper Tests
+
+Test coverage:
+- Transient error classification (429, 5xx, timeouts, connection errors, messages)
+- retry_call (retries, fail-fast on permanent errors, backoff cap)
+- retry_async / with_retry (async form, custom predicate)
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from utils import retry
+from utils.retry import is_transient_error, retry_call, retry_async, with_retry
+
+
+class HttpError(Exception):
+    """Exception carrying an HTTP status code (like ApifyApiError)"""
+
+    def __init__(self, status_code, message='HTTP error'):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CodedError(Exception):
+    """Exception carrying an integer code (like google.genai APIError)"""
+
+    def __init__(self, code):
+        super().__init__(f"{code} ERROR")
+        self.code = code
+
+
+class Flaky:
+    """Callable failing with `errors` in turn, then returning 'ok'"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record retry delays instead of sleeping; uniform returns its upper bound"""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(retry.asyncio, 'sleep', fake_sleep)
+    monkeypatch.setattr(retry.random, 'uniform', lambda low, high: high)
+    return delays
+
+
+# ========== TRANSIENT ERROR CLASSIFICATION ==========
+
+class TestIsTransientError:
+    """Test which errors are retried"""
+
+    def test_rate_limit_status(self):
+        """HTTP 429 is transient"""
+        assert is_transient_error(HttpError(429))
+
+    @pytest.mark.parametrize('status_code', [500, 502, 503, 504])
+    def test_server_error_status(self, status_code):
+        """HTTP 5xx is transient"""
+        assert is_transient_error(HttpError(status_code))
+
+    @pytest.mark.parametrize('status_code', [400, 401, 403, 404])
+    def test_client_error_status(self, status_code):
+        """Other 4xx fail fast, even if the message looks transient"""
+        assert not is_transient_error(HttpError(status_code, 'rate limit timeout'))
+
+    def test_api_error_code(self):
+        """Errors with an integer .code are classified like status codes"""
+        assert is_transient_error(CodedError(429))
+        assert is_transient_error(CodedError(503))
+        assert not is_transient_error(CodedError(400))
+
+    def test_timeout_error(self):
+        """TimeoutError is transient"""
+        assert is_transient_error(TimeoutError())
+
+    def test_connection_error(self):
+        """ConnectionError (and subclasses) is transient"""
+        assert is_transient_error(ConnectionError())
+        assert is_transient_error(ConnectionResetError())
+
+    @pytest.mark.parametrize('message', [
+        'Received 429 Too Many Requests',
+        'Rate limit exceeded',
+        'rate-limited by upstream',
+        'Request timed out',
+        'read timeout',
+        'upstream returned 503',
+    ])
+    def test_transient_message(self, message):
+        """Transient failures reported only in the message are matched"""
+        assert is_transient_error(RuntimeError(message))
+
+    @pytest.mark.parametrize('message', [
+        'Invalid input: startUrls is required',
+        'Actor not found',
+        'Value 4290 out of range',
+    ])
+    def test_permanent_message(self, message):
+        """Other messages are not transient"""
+        assert not is_transient_error(RuntimeError(message))
+
+
+# ========== RETRY CALL ==========
+
+class TestRetryCall:
+    """Test retrying with exponential backoff and full jitter"""
+
+    @pytest.mark.asyncio
+    async def test_success_first_try(self, sleeps):
+        """Successful calls return immediately"""
+        func = Flaky()
+        assert await retry_call(func, 1, key='value') == 'ok'
+        assert func.calls == 1
+        assert sleeps == []
+
+    @pytest.mark.asyncio
+    async def test_transient_retried(self, sleeps):
+        """Transient errors are retried until success"""
+        func = Flaky(TimeoutError(), HttpError(503))
+        assert await retry_call(func, max_attempts=3) == 'ok'
+        assert func.calls == 3
+
+    @pytest.mark.asyncio
+    async def test_permanent_not_retried(self, sleeps):
+        """Permanent errors are raised without retrying"""
+        func = Flaky(HttpError(400))
+        with pytest.raises(HttpError):
+            await retry_call(func)
+        assert func.calls == 1
+        assert sleeps == []
+
+    @pytest.mark.asyncio
+    async def test_attempts_exhausted(self, sleeps):
+        """The last error is raised once attempts are exhausted"""
+        func = Flaky(TimeoutError(), TimeoutError(), TimeoutError('last'))
+        with pytest.raises(TimeoutError, match='last'):
+            await retry_call(func, max_attempts=3)
+        assert func.calls == 3
+        assert len(sleeps) == 2
+
+    @pytest.mark.asyncio
+    async def test_backoff_capped(self, sleeps):
+        """Backoff doubles from base and never exceeds cap"""
+        func = Flaky(*(TimeoutError() for _ in range(5)))
+        assert await retry_call(func, max_attempts=6, base=1.0, cap=5.0) == 'ok'
+        assert sleeps == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+# ========== ASYNC RETRY ==========
+
+class AsyncFlaky(Flaky):
+    """Coroutine function version of Flaky"""
+
+    async def __call__(self, *args, **kwargs):
+        return super().__call__(*args, **kwargs)
+
+
+class TestRetryAsync:
+    """Test the coroutine form and the decorator"""
+
+    @pytest.mark.asyncio
+    async def test_transient_retried(self, sleeps):
+        """Transient errors are retried with jittered backoff"""
+        func = AsyncFlaky(CodedError(429), CodedError(500))
+        assert await retry_async(func, max_attempts=3, base=0.5) == 'ok'
+        assert func.calls == 3
+        assert sleeps == [0.5, 1.0]
+
+    @pytest.mark.asyncio
+    async def test_permanent_not_retried(self, sleeps):
+        """Permanent errors are raised immediately"""
+        func = AsyncFlaky(CodedError(403))
+        with pytest.raises(CodedError):
+            await retry_async(func)
+        assert func.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_custom_predicate(self, sleeps):
+        """predicate overrides the transient classification"""
+        func = AsyncFlaky(ValueError('retry me'))
+        assert await retry_async(func, predicate=lambda e: isinstance(e, ValueError)) == 'ok'
+        assert func.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_decorator(self, sleeps):
+        """with_retry wraps a coroutine function, keeping its name and arguments"""
+        func = AsyncFlaky(TimeoutError(), TimeoutError())
+
+        @with_retry(max_attempts=3, base=2.0, cap=3.0)
+        async def upload(name, size=0):
+            return await func(name, size=size)
+
+        assert await upload('doc', size=1) == 'ok'
+        assert upload.__name__ == 'upload'
+        assert sleeps == [2.0, 3.0]
+
+    @pytest.mark.asyncio
+    async def test_jitter_spreads_retries(self, monkeypatch):
+        """Delays are drawn from [0, backoff], not fixed (no lockstep retries)"""
+        bounds = []
+        monkeypatch.setattr(retry.random, 'uniform', lambda low, high: bounds.append((low, high)) or 0)
+
+        async def no_sleep(delay):
+            pass
+        monkeypatch.setattr(retry.asyncio, 'sleep', no_sleep)
+
+        await retry_async(AsyncFlaky(CodedError(429)), base=1.0)
+        assert bounds == [(0, 1.0)]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v', '--tb=short'])